@@ -0,0 +1,307 @@
+"""
+Offline benchmarks for the Python analytics hot paths.
+
+Runs entirely without network access: inputs are the NSE CSVs in
+backend/data plus synthetic OHLCV series scaled from 1k to 1M rows.
+Each benchmark records best-of-N wall time and peak traced memory.
+Results can be stored as a JSON baseline and later runs are compared
+against it, flagging anything slower or hungrier than the threshold.
+
+Usage (from the repository root):
+    python backend/benchmarks/bench_analytics.py --save-baseline
+    python backend/benchmarks/bench_analytics.py --threshold 0.2
+    python backend/benchmarks/bench_analytics.py --only add_features label_risk --sizes 1000 100000
+"""
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import platform
+import tempfile
+import pathlib
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = pathlib.Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent
+DATA_DIR = BACKEND_DIR / 'data'
+MODELS_DIR = BACKEND_DIR / 'AI_models'
+SAVED_MODELS_DIR = BACKEND_DIR / 'saved_models'
+BASELINE_PATH = BENCH_DIR / 'baseline.json'
+
+for subdir in ('python', 'ml', 'prediction_models'):
+    sys.path.append(str(BACKEND_DIR / subdir))
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+REAL_CSV = 'RELIANCE'
+REAL_CSV_SIZE = 'csv'
+REFERENCE_TICKER = 'AAPL'
+SEED = 42
+
+
+class SkipBenchmark(Exception):
+    """Raised by a setup function when a benchmark cannot run here."""
+
+
+def synthetic_ohlcv(n_rows, seed=SEED):
+    """
+    Geometric Brownian motion OHLCV series with a minute-spaced DatetimeIndex
+    (so 1M rows still fit inside the pandas timestamp range).
+    """
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0003, 0.015, n_rows)
+    close = 100 * np.exp(np.cumsum(returns))
+    open_ = close * (1 + rng.normal(0, 0.003, n_rows))
+    spread = np.abs(rng.normal(0, 0.008, n_rows)) * close
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    volume = rng.integers(100_000, 5_000_000, n_rows).astype(float)
+    index = pd.date_range('2000-01-03 09:15', periods=n_rows, freq='min', name='Date')
+    return pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume}, index=index)
+
+
+def real_ohlcv(symbol=REAL_CSV):
+    """
+    Load one of the bundled NSE CSVs in the same shape as yfinance history.
+    """
+    df = pd.read_csv(DATA_DIR / f'{symbol}.csv', usecols=['Date', 'Open', 'High', 'Low', 'Close', 'Volume'])
+    df['Date'] = pd.to_datetime(df['Date'])
+    return df.set_index('Date').sort_index()
+
+
+def load_ohlcv(size):
+    return real_ohlcv() if size == REAL_CSV_SIZE else synthetic_ohlcv(size)
+
+
+def _import_risk_analysis():
+    try:
+        import risk_analysis
+    except ImportError as e:
+        raise SkipBenchmark(f'risk_analysis unavailable: {e}')
+    return risk_analysis
+
+
+# === Benchmarks ===
+# Each setup(size) returns a zero-argument callable; only the callable is timed.
+
+def setup_add_features(size):
+    ra = _import_risk_analysis()
+    data = ra.preprocess_data(load_ohlcv(size))
+    return lambda: ra.add_features(data)
+
+
+def setup_label_risk(size):
+    ra = _import_risk_analysis()
+    data = ra.add_features(ra.preprocess_data(load_ohlcv(size)))
+    return lambda: ra.label_risk(data)
+
+
+def setup_train_and_save_model(size):
+    ra = _import_risk_analysis()
+    raw = load_ohlcv(size)
+    out_dir = pathlib.Path(tempfile.mkdtemp(prefix='bench_models_'))
+
+    # Serve the benchmark series instead of hitting Yahoo Finance, and keep
+    # the artifacts out of backend/AI_models.
+    ra.get_stock_data = lambda ticker, *args, **kwargs: raw
+    ra.MODELS_DIR = out_dir
+    ra.FEATURE_STORE.directory = out_dir
+    model_path = str(out_dir / 'BENCH_risk_model.pkl')
+    scaler_path = str(out_dir / 'BENCH_scaler.pkl')
+    return lambda: ra.train_and_save_model('BENCH', model_path, scaler_path)
+
+
+def setup_risk_inference(size):
+    ra = _import_risk_analysis()
+    model_path = str(MODELS_DIR / f'{REFERENCE_TICKER}_risk_model.pkl')
+    scaler_path = str(MODELS_DIR / f'{REFERENCE_TICKER}_scaler.pkl')
+    model, scaler, features_used = ra.load_model_and_scaler(model_path, scaler_path)
+    data = ra.label_risk(ra.add_features(ra.preprocess_data(load_ohlcv(size))))
+    X = data[features_used].values
+
+    def run():
+        X_scaled = scaler.transform(X)
+        return model.predict_proba(X_scaled)
+    return run
+
+
+def setup_predict_next_day_close(size):
+    try:
+        import predict
+    except ImportError as e:
+        raise SkipBenchmark(f'predict unavailable: {e}')
+    predict.DATA_DIR = str(DATA_DIR)
+    predict.MODEL_DIR = str(SAVED_MODELS_DIR)
+    return lambda: predict.predict_next_day_close(REAL_CSV)
+
+
+def setup_create_sequences(size):
+    try:
+        import trainModels
+    except ImportError as e:
+        raise SkipBenchmark(f'trainModels unavailable: {e}')
+    df = load_ohlcv(size)[['Open', 'High', 'Low', 'Close', 'Volume']]
+    scaled = ((df - df.min()) / (df.max() - df.min())).values
+    return lambda: trainModels.create_sequences(scaled, trainModels.SEQ_LEN)
+
+
+HEADLINE_WORDS = ('stocks rally as markets surge on strong earnings beat while investors fear '
+                  'losses slump weak guidance record profit downgrade upgrade crash growth').split()
+
+
+def setup_analyze_sentiment(size):
+    try:
+        import sentiment_analysis
+    except ImportError as e:
+        raise SkipBenchmark(f'sentiment_analysis unavailable: {e}')
+    n_texts = len(real_ohlcv()) if size == REAL_CSV_SIZE else size
+    rng = np.random.default_rng(SEED)
+    texts = [' '.join(rng.choice(HEADLINE_WORDS, 20)) for _ in range(n_texts)]
+
+    def run():
+        return [sentiment_analysis.analyze_sentiment(text) for text in texts]
+    return run
+
+
+# name -> (setup function, largest synthetic size worth running; 0 = bundled CSV only)
+BENCHMARKS = {
+    'add_features': (setup_add_features, 1_000_000),
+    'label_risk': (setup_label_risk, 1_000_000),
+    'train_and_save_model': (setup_train_and_save_model, 10_000),
+    'risk_inference': (setup_risk_inference, 1_000_000),
+    'predict_next_day_close': (setup_predict_next_day_close, 0),
+    'create_sequences': (setup_create_sequences, 100_000),
+    'analyze_sentiment': (setup_analyze_sentiment, 10_000),
+}
+
+
+def measure(run, repeats):
+    """
+    Best-of-N wall time with tracing off, then one traced run for peak memory.
+    """
+    times = []
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'time_s': min(times),
+        'time_mean_s': sum(times) / len(times),
+        'peak_mem_mb': peak / (1024 * 1024)
+    }
+
+
+def run_benchmarks(names, sizes, repeats):
+    results = {}
+    for name in names:
+        setup, max_rows = BENCHMARKS[name]
+        for size in [REAL_CSV_SIZE] + sizes:
+            key = f'{name}[{size}]'
+            if size != REAL_CSV_SIZE and size > max_rows:
+                continue
+            try:
+                run = setup(size)
+            except SkipBenchmark as e:
+                print(f'{key:<40} skipped ({e})')
+                continue
+            # A grid-search training run takes long enough that one timing is enough
+            n = 1 if name == 'train_and_save_model' else repeats
+            results[key] = measure(run, n)
+            r = results[key]
+            print(f"{key:<40} {r['time_s'] * 1000:>12.2f} ms {r['peak_mem_mb']:>10.2f} MB")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Return a list of regressions: entries slower or using more memory than
+    the baseline by more than the threshold fraction.
+    """
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        for metric in ('time_s', 'peak_mem_mb'):
+            # Ignore noise on sub-millisecond / sub-megabyte measurements
+            floor = 1e-3 if metric == 'time_s' else 1.0
+            if previous[metric] < floor and current[metric] < floor:
+                continue
+            if current[metric] > previous[metric] * (1 + threshold):
+                regressions.append({
+                    'benchmark': key,
+                    'metric': metric,
+                    'baseline': previous[metric],
+                    'current': current[metric],
+                    'change': current[metric] / previous[metric] - 1 if previous[metric] else float('inf')
+                })
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Offline analytics benchmarks')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='Benchmarks to run (default: all)')
+    parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES, help='Synthetic series lengths')
+    parser.add_argument('--repeats', type=int, default=3, help='Timed repetitions per benchmark')
+    parser.add_argument('--baseline', type=str, default=str(BASELINE_PATH), help='Baseline JSON path')
+    parser.add_argument('--save-baseline', action='store_true', help='Write results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed slowdown before flagging (0.2 = 20%%)')
+    parser.add_argument('--output', type=str, default=None, help='Also write the results JSON here')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    names = args.only or list(BENCHMARKS)
+    results = run_benchmarks(names, sorted(args.sizes), args.repeats)
+
+    report = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update({k: v for k, v in report.items() if k != 'results'})
+        baseline.setdefault('results', {}).update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        print(f'Baseline written to {args.baseline}')
+        sys.exit(0)
+
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}; run with --save-baseline first.')
+        sys.exit(0)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline.get('results', {}), args.threshold)
+    if regressions:
+        print(f'\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:')
+        for r in regressions:
+            print(f"  {r['benchmark']:<40} {r['metric']:<12} {r['baseline']:.4f} -> {r['current']:.4f} (+{r['change']:.0%})")
+        sys.exit(1)
+    print(f'\nNo regressions beyond {args.threshold:.0%}.')
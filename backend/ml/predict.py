@@ -1,8 +1,20 @@
 import os
+import sys
+import json
+import argparse
+import glob
+import cProfile
 import numpy as np
 import pandas as pd
+from functools import lru_cache
 from keras.models import load_model
-from sklearn.preprocessing import MinMaxScaler
+
+# Shared helpers live next to the risk analysis script
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python'))
+import stage_timer
+import market_data
+from atomic_io import atomic_write_json
+import scaling
 
 # === Config ===
 LOOKBACK = 60
@@ -11,22 +23,31 @@ TARGET_COL = "Close"
 
 DATA_DIR = "backend/data"
 MODEL_DIR = "backend/saved_models"
+SHARED_MODEL_NAME = "NIFTY50_shared"
+HISTORY_CACHE_DIR = os.path.join(MODEL_DIR, "cache")
+PREDICT_BATCH_SIZE = 1024
 
 def load_data(stock_file):
-    df = pd.read_csv(stock_file).dropna()
+    # Only the price columns have to be present; VWAP, trades and deliverables
+    # are empty for older bars and for bars appended by ingest.py
+    df = pd.read_csv(stock_file).dropna(subset=FEATURE_COLS)
     df = df.sort_values("Date")
     return df
 
-def prepare_input(df):
-    scaler = MinMaxScaler()
-    df_scaled = scaler.fit_transform(df[FEATURE_COLS + [TARGET_COL]])
-    X = df_scaled[-LOOKBACK:, :len(FEATURE_COLS)]
-    return np.expand_dims(X, axis=0), scaler
+def model_range(stock_name):
+    """
+    Scaling range the stock's model was trained with (see scaling.model_range).
+    """
+    return scaling.model_range(os.path.join(MODEL_DIR, f"{stock_name}_lstm_meta.json"),
+                               os.path.join(DATA_DIR, f"{stock_name}.csv"))
+
+def prepare_input(df, data_min, data_max):
+    X = scaling.scale(df[FEATURE_COLS].values[-LOOKBACK:], data_min, data_max)
+    return np.expand_dims(X, axis=0)
 
-def inverse_prediction(y_scaled, scaler):
-    padded = np.zeros((1, len(FEATURE_COLS) + 1))  # +1 for target col
-    padded[0, len(FEATURE_COLS)] = y_scaled[0][0]
-    return scaler.inverse_transform(padded)[0][-1]
+def inverse_prediction(y_scaled, data_min, data_max):
+    close_idx = FEATURE_COLS.index(TARGET_COL)
+    return float(scaling.unscale(y_scaled[0][0], data_min[close_idx], data_max[close_idx]))
 
 def predict_next_day_close(stock_name):
     csv_path = os.path.join(DATA_DIR, f"{stock_name}.csv")
@@ -36,15 +57,191 @@ def predict_next_day_close(stock_name):
         print(f"❌ Missing data/model for {stock_name}")
         return
 
-    df = load_data(csv_path)
-    model = load_model(model_path)
-    X, scaler = prepare_input(df)
-    
-    y_pred_scaled = model.predict(X)
-    predicted_close = inverse_prediction(y_pred_scaled, scaler)
+    with stage_timer.stage('load_data'):
+        df = load_data(csv_path)
+    with stage_timer.stage('load_model'):
+        model = load_model(model_path)
+    with stage_timer.stage('prepare_input'):
+        data_min, data_max = model_range(stock_name)
+        X = prepare_input(df, data_min, data_max)
+
+    with stage_timer.stage('predict'):
+        y_pred_scaled = model.predict(X)
+        predicted_close = inverse_prediction(y_pred_scaled, data_min, data_max)
 
     print(f"\n📈 Predicted Close Price for {stock_name} (Next Day): ₹{predicted_close:.2f}")
+    return predicted_close
+
+def walk_forward_windows(scaled, lookback=LOOKBACK):
+    """
+    Every lookback-long window of the scaled features as a zero-copy strided
+    view of shape (n - lookback + 1, lookback, n_features). Window i ends at
+    row i + lookback - 1 and predicts row i + lookback.
+    """
+    return np.lib.stride_tricks.sliding_window_view(scaled, lookback, axis=0).transpose(0, 2, 1)
+
+def prediction_metrics(predicted, actual, previous):
+    """
+    MAE, MAPE (%) and directional accuracy of one-step predictions.
+    """
+    errors = predicted - actual
+    direction_hits = np.sign(predicted - previous) == np.sign(actual - previous)
+    return {
+        'mae': float(np.mean(np.abs(errors))),
+        'mape': float(np.mean(np.abs(errors / actual)) * 100),
+        'directional_accuracy': float(np.mean(direction_hits))
+    }
+
+def predict_history(stock_name, days=250, use_cache=True):
+    """
+    Walk-forward one-step predictions for the last `days` trading days, scored
+    in large batches from strided windows with one model load, scaled with
+    the range the model was trained with. Returns dates, predicted and actual closes, error metrics and the
+    forecast for the next day. Results are cached per model version and data
+    fingerprint.
+    """
+    if days < 1:
+        raise ValueError(f"days must be at least 1, got {days}")
+    csv_path = os.path.join(DATA_DIR, f"{stock_name}.csv")
+    model_path = os.path.join(MODEL_DIR, f"{stock_name}_lstm_model.h5")
+    if not os.path.exists(csv_path) or not os.path.exists(model_path):
+        raise ValueError(f"Missing data/model for {stock_name}")
+
+    model_version = market_data.file_fingerprint(model_path)
+    # The ingestion manifest's content hash, so only changed symbols miss the cache
+    data_version = market_data.CsvProvider(DATA_DIR).fingerprint(stock_name)
+    cache_prefix = f"{stock_name}_history_{days}_"
+    cache_path = os.path.join(HISTORY_CACHE_DIR, f"{cache_prefix}{model_version}_{data_version}.json")
+    if use_cache and os.path.exists(cache_path):
+        with open(cache_path) as f:
+            return json.load(f)
+
+    with stage_timer.stage('load_data'):
+        df = load_data(csv_path)
+    if len(df) <= LOOKBACK + 1:
+        raise ValueError(f"Not enough data for {stock_name}")
+    with stage_timer.stage('load_model'):
+        model = load_model(model_path)
+
+    with stage_timer.stage('prepare_input'):
+        data_min, data_max = model_range(stock_name)
+        windows = walk_forward_windows(scaling.scale(df[FEATURE_COLS].values, data_min, data_max))
+        # Windows with a known next-day target, plus the final one for tomorrow
+        days = min(days, len(windows) - 1)
+        X = windows[-(days + 1):]
+
+    with stage_timer.stage('predict'):
+        y_pred_scaled = model.predict(X, batch_size=PREDICT_BATCH_SIZE, verbose=0)[:, 0]
+        close_idx = FEATURE_COLS.index(TARGET_COL)
+        predicted = scaling.unscale(y_pred_scaled, data_min[close_idx], data_max[close_idx])
+
+    closes = df[TARGET_COL].values
+    dates = df["Date"].astype(str).values
+    actual = closes[-days:]
+    result = {
+        'stock': stock_name,
+        'model_version': model_version,
+        'dates': dates[-days:].tolist(),
+        'predicted': predicted[:-1].round(4).tolist(),
+        'actual': actual.tolist(),
+        'metrics': prediction_metrics(predicted[:-1], actual, closes[-days - 1:-1]),
+        'next_day': float(predicted[-1])
+    }
+
+    # Results for older model or data versions are superseded
+    for stale in glob.glob(os.path.join(glob.escape(HISTORY_CACHE_DIR), f"{glob.escape(cache_prefix)}*.json")):
+        if stale != cache_path:
+            os.remove(stale)
+    atomic_write_json(cache_path, result)
+    return result
+
+@lru_cache(maxsize=1)
+def load_shared_model():
+    """
+    Load the multi-stock model (see trainSharedModel.py) and its symbol/scaling
+    metadata once per process.
+    """
+    model = load_model(os.path.join(MODEL_DIR, f"{SHARED_MODEL_NAME}_lstm_model.h5"))
+    with open(os.path.join(MODEL_DIR, f"{SHARED_MODEL_NAME}_lstm_meta.json")) as f:
+        meta = json.load(f)
+    return model, meta
+
+def predict_next_day_close_all(stock_names=None):
+    """
+    Predict tomorrow's close for many stocks with the shared model in a single
+    forward pass. Inputs are scaled with the per-symbol parameters saved at
+    training time. Returns {stock_name: predicted_close}.
+    """
+    with stage_timer.stage('load_model'):
+        model, meta = load_shared_model()
+    symbols = meta['symbols']
+    stock_names = stock_names or symbols
+
+    windows, ids, names = [], [], []
+    with stage_timer.stage('prepare_input'):
+        for stock_name in stock_names:
+            csv_path = os.path.join(DATA_DIR, f"{stock_name}.csv")
+            if stock_name not in meta['scaling'] or not os.path.exists(csv_path):
+                print(f"❌ Missing data/shared-model entry for {stock_name}")
+                continue
+            values = load_data(csv_path)[FEATURE_COLS].values[-LOOKBACK:].astype(np.float32)
+            if len(values) < LOOKBACK:
+                continue
+            data_min = np.array(meta['scaling'][stock_name]['min'], dtype=np.float32)
+            data_max = np.array(meta['scaling'][stock_name]['max'], dtype=np.float32)
+            windows.append(scaling.scale(values, data_min, data_max))
+            ids.append(symbols.index(stock_name))
+            names.append(stock_name)
+
+    if not windows:
+        return {}
+
+    with stage_timer.stage('predict'):
+        y_pred_scaled = model.predict([np.stack(windows), np.array(ids, dtype=np.int32)],
+                                      batch_size=len(windows), verbose=0)[:, 0]
+
+    close_idx = FEATURE_COLS.index(TARGET_COL)
+    predictions = {}
+    for name, y in zip(names, y_pred_scaled):
+        close_min = meta['scaling'][name]['min'][close_idx]
+        close_max = meta['scaling'][name]['max'][close_idx]
+        predictions[name] = float(y * (close_max - close_min) + close_min)
+    return predictions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Next-day close prediction')
+    parser.add_argument('--stock', type=str, default='ADANIPORTS', help='Stock name matching a CSV in backend/data')
+    parser.add_argument('--all', action='store_true',
+                        help='Predict every symbol with the shared multi-stock model')
+    parser.add_argument('--history', type=int, default=None,
+                        help='Walk-forward predictions and error metrics for the last N days')
+    parser.add_argument('--timings', action='store_true', help='Print per-stage timings as JSON')
+    parser.add_argument('--profile', type=str, default=None, help='Write cProfile stats for this run to the given path')
+    return parser.parse_args()
 
 # === Example usage ===
 if __name__ == "__main__":
-    predict_next_day_close("ADANIPORTS")
+    args = parse_args()
+    if args.timings:
+        stage_timer.enable()
+
+    if args.history is not None:
+        run, run_args = predict_history, (args.stock, args.history)
+    elif args.all:
+        run, run_args = predict_next_day_close_all, ()
+    else:
+        run, run_args = predict_next_day_close, (args.stock,)
+    if args.profile:
+        profiler = cProfile.Profile()
+        result = profiler.runcall(run, *run_args)
+        profiler.dump_stats(args.profile)
+    else:
+        result = run(*run_args)
+
+    if args.history is not None:
+        print(json.dumps(result))
+    elif args.all:
+        print(json.dumps({'predictions': result}))
+
+    if stage_timer.ENABLED:
+        print(json.dumps({'stock': args.stock, 'timings': stage_timer.get_timings()}))
@@ -0,0 +1,39 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+# Columns the LSTM models scale and take as input, in order
+SCALED_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+def scale(values, data_min, data_max):
+    """
+    Min-max scale values with a saved range (a constant column maps to 0).
+    """
+    return (values - data_min) / np.where(data_max > data_min, data_max - data_min, 1)
+
+def unscale(scaled, data_min, data_max):
+    return scaled * np.where(data_max > data_min, data_max - data_min, 1) + data_min
+
+def fitted_range(df):
+    """
+    Range of each scaled column, as saved in a model's meta file.
+    """
+    values = df[SCALED_COLUMNS]
+    return {'min': values.min().tolist(), 'max': values.max().tolist()}
+
+def model_range(meta_path, csv_path):
+    """
+    (data_min, data_max) a per-stock model was trained with. Models saved
+    before the range was recorded were fitted on the rows their loader kept
+    then, those with every CSV column present, so it is recomputed from those.
+    """
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if 'scaling' in meta:
+            return np.array(meta['scaling']['min']), np.array(meta['scaling']['max'])
+
+    legacy = fitted_range(pd.read_csv(csv_path).dropna())
+    return np.array(legacy['min']), np.array(legacy['max'])
@@ -1,23 +1,43 @@
 import os
+import json
+import time
+import argparse
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-from sklearn.preprocessing import MinMaxScaler
-from tensorflow.keras.models import Sequential
+from tensorflow.keras.models import Sequential, load_model
 from tensorflow.keras.layers import LSTM, Dense
 from tensorflow.keras.callbacks import EarlyStopping
+from tensorflow.keras.optimizers import Adam
+
+import scaling
 
 DATA_DIR = './backend/data'  
+MODEL_DIR = './backend/saved_models'
 SEQ_LEN = 60
 EPOCHS = 20
 BATCH_SIZE = 32
 
+# Fine-tuning on new bars
+FINE_TUNE_EPOCHS = 3
+FINE_TUNE_LR = 1e-4
+# Windows from before the new bars replayed alongside them, so older patterns are not forgotten
+FINE_TUNE_WINDOWS = 256
+# Share of the replayed windows held out to judge the fine-tune
+FINE_TUNE_HOLDOUT = 0.2
+# Force a full retrain after this many fine-tunes or days
+MAX_FINE_TUNES = 8
+FULL_RETRAIN_DAYS = 90
+# Largest relative validation-loss increase a fine-tune may cause and still be kept
+FINE_TUNE_LOSS_TOLERANCE = 0.05
+
 def preprocess_data(filepath):
     df = pd.read_csv(filepath)
     df['Date'] = pd.to_datetime(df['Date'])
     df.set_index('Date', inplace=True)
-    df = df.sort_index().dropna()
-    return df[['Open', 'High', 'Low', 'Close', 'Volume']]
+    # Rows are dropped only for missing prices; the other NSE columns are
+    # empty for older bars and for bars appended by ingest.py
+    return df.sort_index()[['Open', 'High', 'Low', 'Close', 'Volume']].dropna()
 
 def create_sequences(data, seq_length):
     X, y = [], []
@@ -43,12 +63,25 @@ def train_model(X_train, y_train, X_val, y_val):
     )
     return model
 
+def model_paths(stock_name):
+    model_path = os.path.join(MODEL_DIR, f'{stock_name}_lstm_model.h5')
+    meta_path = os.path.join(MODEL_DIR, f'{stock_name}_lstm_meta.json')
+    return model_path, meta_path
+
+def save_model(model, stock_name, meta):
+    model_path, meta_path = model_paths(stock_name)
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    model.save(model_path)
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+
 def run_pipeline(file):
     print(f"Processing {file}...")
     df = preprocess_data(os.path.join(DATA_DIR, file))
 
-    scaler = MinMaxScaler()
-    scaled = scaler.fit_transform(df)
+    # Saved with the model, so inference and fine-tuning scale with the same range
+    data_range = scaling.fitted_range(df)
+    scaled = scaling.scale(df.values, np.array(data_range['min']), np.array(data_range['max']))
 
     X, y = create_sequences(scaled, SEQ_LEN)
     split = int(0.8 * len(X))
@@ -57,15 +90,101 @@ def run_pipeline(file):
 
     model = train_model(X_train, y_train, X_val, y_val)
 
-    # Save model
+    # Save model along with the watermark fine-tuning starts from
     stock_name = os.path.splitext(file)[0]
-    model.save(f'{stock_name}_lstm_model.h5')
+    save_model(model, stock_name, {
+        'last_date': str(df.index[-1].date()),
+        'last_full_train': time.time(),
+        'fine_tunes': 0,
+        'val_loss': float(model.evaluate(X_val, y_val, verbose=0)),
+        'scaling': data_range
+    })
     print(f"Saved model for {stock_name} ✅")
 
+def fine_tune_split(X, y, new_rows):
+    """
+    Split time-ordered windows for fine-tuning: every window predicting one of
+    the last `new_rows` bars is trained on, together with the earlier replayed
+    windows except a random FINE_TUNE_HOLDOUT share held out for validation.
+    Returns X_train, y_train, X_val, y_val.
+    """
+    n_replay = len(X) - new_rows
+    rng = np.random.default_rng(42)
+    held_out = np.zeros(len(X), dtype=bool)
+    held_out[rng.choice(n_replay, max(1, int(FINE_TUNE_HOLDOUT * n_replay)), replace=False)] = True
+    return X[~held_out], y[~held_out], X[held_out], y[held_out]
+
+def fine_tune_pipeline(file):
+    """
+    Fine-tune an existing model on the bars added since it was last trained,
+    starting from its saved weights. Falls back to run_pipeline when there is
+    no saved model, too many fine-tunes have accumulated, the last full train
+    is too old, or the model's scaling range was not recorded. The fine-tuned
+    model is kept only if its loss on held-out recent windows does not get
+    worse by more than the tolerance.
+    """
+    stock_name = os.path.splitext(file)[0]
+    model_path, meta_path = model_paths(stock_name)
+    if not os.path.exists(model_path) or not os.path.exists(meta_path):
+        return run_pipeline(file)
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if (meta['fine_tunes'] >= MAX_FINE_TUNES or time.time() - meta['last_full_train'] > FULL_RETRAIN_DAYS * 86400
+            or 'scaling' not in meta):
+        return run_pipeline(file)
+
+    df = preprocess_data(os.path.join(DATA_DIR, file))
+    new_rows = int((df.index > pd.Timestamp(meta['last_date'])).sum())
+    if new_rows == 0:
+        print(f"No new bars for {stock_name}, skipping")
+        return
+
+    print(f"Fine-tuning {stock_name} on {new_rows} new bars...")
+    # The range the model was trained with; new prices outside it scale past [0, 1]
+    scaled = scaling.scale(df.values, np.array(meta['scaling']['min']), np.array(meta['scaling']['max']))
+
+    # Only the windows ending in the recent tail are built
+    X, y = create_sequences(scaled[-(new_rows + FINE_TUNE_WINDOWS + SEQ_LEN):], SEQ_LEN)
+    if len(X) - new_rows < 2:
+        return run_pipeline(file)
+    X_train, y_train, X_val, y_val = fine_tune_split(X, y, new_rows)
+
+    model = load_model(model_path)
+    old_loss = float(model.evaluate(X_val, y_val, verbose=0))
+    model.compile(optimizer=Adam(learning_rate=FINE_TUNE_LR), loss='mean_squared_error')
+    model.fit(X_train, y_train, epochs=FINE_TUNE_EPOCHS, batch_size=BATCH_SIZE, verbose=0)
+    new_loss = float(model.evaluate(X_val, y_val, verbose=0))
+
+    if new_loss > old_loss * (1 + FINE_TUNE_LOSS_TOLERANCE):
+        print(f"Fine-tune rejected for {stock_name} (val loss {old_loss:.6f} -> {new_loss:.6f}), retraining")
+        return run_pipeline(file)
+
+    meta.update({
+        'last_date': str(df.index[-1].date()),
+        'fine_tunes': meta['fine_tunes'] + 1,
+        'val_loss': new_loss
+    })
+    save_model(model, stock_name, meta)
+    print(f"Fine-tuned model for {stock_name} ✅ (val loss {old_loss:.6f} -> {new_loss:.6f})")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Train per-stock LSTM models')
+    parser.add_argument('--mode', choices=['full', 'incremental'], default='full',
+                        help='full: retrain from scratch; incremental: fine-tune saved models on new bars')
+    parser.add_argument('--stock', type=str, default=None, help='Only process this stock')
+    return parser.parse_args()
+
 # Run on all CSVs
-for filename in os.listdir(DATA_DIR):
-    if filename.endswith('.csv'):
-        try:
-            run_pipeline(filename)
-        except Exception as e:
-            print(f"Failed to process {filename}: {e}")
+if __name__ == "__main__":
+    args = parse_args()
+    pipeline = fine_tune_pipeline if args.mode == 'incremental' else run_pipeline
+    for filename in os.listdir(DATA_DIR):
+        if filename.endswith('.csv') and filename != 'stock_metadata.csv':
+            if args.stock and filename != f'{args.stock}.csv':
+                continue
+            try:
+                pipeline(filename)
+            except Exception as e:
+                print(f"Failed to process {filename}: {e}")
+
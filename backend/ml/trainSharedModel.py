@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+from tensorflow.keras.models import Model, load_model
+from tensorflow.keras.layers import Input, LSTM, Dense, Embedding, Flatten, RepeatVector, Concatenate
+from tensorflow.keras.callbacks import EarlyStopping
+
+import scaling
+from trainModels import DATA_DIR, MODEL_DIR, SEQ_LEN, EPOCHS, BATCH_SIZE, preprocess_data, create_sequences
+
+# One model for every symbol, conditioned on a learned per-symbol embedding
+SHARED_MODEL_NAME = 'NIFTY50_shared'
+EMBEDDING_DIM = 8
+# Most recent windows taken from each symbol, to bound training memory
+MAX_WINDOWS_PER_SYMBOL = 2000
+CLOSE_IDX = 3
+
+def shared_model_paths():
+    model_path = os.path.join(MODEL_DIR, f'{SHARED_MODEL_NAME}_lstm_model.h5')
+    meta_path = os.path.join(MODEL_DIR, f'{SHARED_MODEL_NAME}_lstm_meta.json')
+    report_path = os.path.join(MODEL_DIR, f'{SHARED_MODEL_NAME}_lstm_report.json')
+    return model_path, meta_path, report_path
+
+def stock_files():
+    return sorted(
+        f for f in os.listdir(DATA_DIR)
+        if f.endswith('.csv') and f != 'stock_metadata.csv'
+    )
+
+def load_symbol_windows(max_windows=MAX_WINDOWS_PER_SYMBOL):
+    """
+    Build scaled windows for every stock CSV. Each symbol is min-max scaled on
+    its own history (as the per-stock models are) and split 80/20 in time.
+    Returns the per-symbol splits and the scaling parameters needed at inference.
+    """
+    splits = {}
+    scaling = {}
+    for file in stock_files():
+        stock_name = os.path.splitext(file)[0]
+        try:
+            df = preprocess_data(os.path.join(DATA_DIR, file))
+        except Exception as e:
+            print(f"Skipping {file}: {e}")
+            continue
+        if len(df) <= SEQ_LEN + 10:
+            print(f"Skipping {file}: not enough rows")
+            continue
+
+        values = df.values.astype(np.float32)
+        data_min, data_max = values.min(axis=0), values.max(axis=0)
+        scaled = scaling.scale(values, data_min, data_max)
+
+        X, y = create_sequences(scaled[-(max_windows + SEQ_LEN):], SEQ_LEN)
+        split = int(0.8 * len(X))
+        splits[stock_name] = (X[:split], y[:split], X[split:], y[split:])
+        scaling[stock_name] = {
+            'min': data_min.tolist(),
+            'max': data_max.tolist(),
+            'last_date': str(df.index[-1].date())
+        }
+    return splits, scaling
+
+def build_shared_model(n_symbols, n_features):
+    seq_in = Input(shape=(SEQ_LEN, n_features), name='window')
+    symbol_in = Input(shape=(1,), dtype='int32', name='symbol')
+
+    # Broadcast the symbol embedding to every timestep of the window
+    embedding = Flatten()(Embedding(n_symbols, EMBEDDING_DIM, name='symbol_embedding')(symbol_in))
+    x = Concatenate()([seq_in, RepeatVector(SEQ_LEN)(embedding)])
+    x = LSTM(64, return_sequences=True)(x)
+    x = LSTM(32)(x)
+    out = Dense(1)(x)
+
+    model = Model(inputs=[seq_in, symbol_in], outputs=out)
+    model.compile(optimizer='adam', loss='mean_squared_error')
+    return model
+
+def stack_splits(splits, symbols):
+    X_train, y_train, ids_train, X_val, y_val, ids_val = [], [], [], [], [], []
+    for i, symbol in enumerate(symbols):
+        Xt, yt, Xv, yv = splits[symbol]
+        X_train.append(Xt)
+        y_train.append(yt)
+        ids_train.append(np.full(len(Xt), i, dtype=np.int32))
+        X_val.append(Xv)
+        y_val.append(yv)
+        ids_val.append(np.full(len(Xv), i, dtype=np.int32))
+    return (np.concatenate(X_train), np.concatenate(y_train), np.concatenate(ids_train),
+            np.concatenate(X_val), np.concatenate(y_val), np.concatenate(ids_val))
+
+def train_shared(max_windows=MAX_WINDOWS_PER_SYMBOL):
+    splits, scaling = load_symbol_windows(max_windows)
+    symbols = sorted(splits)
+    X_train, y_train, ids_train, X_val, y_val, ids_val = stack_splits(splits, symbols)
+    print(f"Training shared model on {len(X_train)} windows from {len(symbols)} symbols...")
+
+    model = build_shared_model(len(symbols), X_train.shape[2])
+    model.fit(
+        [X_train, ids_train], y_train,
+        epochs=EPOCHS,
+        batch_size=BATCH_SIZE,
+        validation_data=([X_val, ids_val], y_val),
+        callbacks=[EarlyStopping(patience=3, restore_best_weights=True)],
+        verbose=0
+    )
+
+    model_path, meta_path, _ = shared_model_paths()
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    model.save(model_path)
+    with open(meta_path, 'w') as f:
+        json.dump({'symbols': symbols, 'seq_len': SEQ_LEN, 'scaling': scaling, 'trained_at': time.time()}, f)
+    print(f"Saved shared model for {len(symbols)} symbols ✅")
+    return model, splits, symbols
+
+def compare_with_per_stock(model, splits, symbols):
+    """
+    Compare the shared model with the per-stock models: weight memory, file
+    size, load time, and validation MSE per symbol on the same windows. Each
+    per-stock model sees the windows scaled with its own training range, and
+    its predictions are mapped back to the shared model's scale before the
+    error is taken.
+    """
+    model_path, meta_path, report_path = shared_model_paths()
+    with open(meta_path) as f:
+        shared_scaling = json.load(f)['scaling']
+
+    start = time.perf_counter()
+    load_model(model_path)
+    shared_load_s = time.perf_counter() - start
+
+    per_symbol = {}
+    per_stock_params = per_stock_bytes = 0
+    per_stock_load_s = 0.0
+    for i, symbol in enumerate(symbols):
+        _, _, X_val, y_val = splits[symbol]
+        ids = np.full(len(X_val), i, dtype=np.int32)
+        entry = {'shared_val_mse': float(model.evaluate([X_val, ids], y_val, verbose=0, batch_size=1024))}
+
+        stock_model_path = os.path.join(MODEL_DIR, f'{symbol}_lstm_model.h5')
+        if os.path.exists(stock_model_path):
+            start = time.perf_counter()
+            stock_model = load_model(stock_model_path)
+            per_stock_load_s += time.perf_counter() - start
+            per_stock_params += stock_model.count_params()
+            per_stock_bytes += os.path.getsize(stock_model_path)
+
+            shared_min = np.array(shared_scaling[symbol]['min'])
+            shared_max = np.array(shared_scaling[symbol]['max'])
+            stock_min, stock_max = scaling.model_range(os.path.join(MODEL_DIR, f'{symbol}_lstm_meta.json'),
+                                                       os.path.join(DATA_DIR, f'{symbol}.csv'))
+            X_stock = scaling.scale(scaling.unscale(X_val, shared_min, shared_max), stock_min, stock_max)
+            predicted = scaling.unscale(stock_model.predict(X_stock, verbose=0, batch_size=1024)[:, 0],
+                                        stock_min[CLOSE_IDX], stock_max[CLOSE_IDX])
+            predicted = scaling.scale(predicted, shared_min[CLOSE_IDX], shared_max[CLOSE_IDX])
+            entry['per_stock_val_mse'] = float(np.mean((predicted - y_val) ** 2))
+        per_symbol[symbol] = entry
+
+    report = {
+        'symbols': len(symbols),
+        'shared': {
+            'params': model.count_params(),
+            'weights_mb': model.count_params() * 4 / 1e6,
+            'file_mb': os.path.getsize(model_path) / 1e6,
+            'load_s': shared_load_s
+        },
+        'per_stock': {
+            'models': sum(1 for e in per_symbol.values() if 'per_stock_val_mse' in e),
+            'params': per_stock_params,
+            'weights_mb': per_stock_params * 4 / 1e6,
+            'file_mb': per_stock_bytes / 1e6,
+            'load_s': per_stock_load_s
+        },
+        'per_symbol': per_symbol
+    }
+    compared = [e for e in per_symbol.values() if 'per_stock_val_mse' in e]
+    if compared:
+        report['shared_better_on'] = sum(e['shared_val_mse'] <= e['per_stock_val_mse'] for e in compared)
+        report['median_val_mse'] = {
+            'shared': float(np.median([e['shared_val_mse'] for e in compared])),
+            'per_stock': float(np.median([e['per_stock_val_mse'] for e in compared]))
+        }
+
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Shared:    {report['shared']['weights_mb']:.2f} MB weights, loads in {shared_load_s:.2f}s")
+    print(f"Per-stock: {report['per_stock']['weights_mb']:.2f} MB weights, loads in {per_stock_load_s:.2f}s")
+    if compared:
+        print(f"Shared model has lower validation MSE on {report['shared_better_on']}/{len(compared)} symbols")
+    print(f"Report written to {report_path}")
+    return report
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Train one LSTM shared by all symbols')
+    parser.add_argument('--max-windows', type=int, default=MAX_WINDOWS_PER_SYMBOL,
+                        help='Most recent windows used per symbol')
+    parser.add_argument('--no-report', action='store_true', help='Skip the comparison with per-stock models')
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    model, splits, symbols = train_shared(args.max_windows)
+    if not args.no_report:
+        compare_with_per_stock(model, splits, symbols)
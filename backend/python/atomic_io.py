@@ -0,0 +1,40 @@
+import os
+import json
+import tempfile
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path, mode='w'):
+    """
+    Write a file via a temporary sibling and an atomic rename, so readers
+    (and concurrent writers) only ever see the old or the complete new file.
+
+    Usage:
+        with atomic_write(path) as f:
+            f.write(data)
+    """
+    path = str(path)
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates files owner-only; keep the permissions of the file being replaced
+        os.chmod(tmp_path, os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_json(path, obj, **kwargs):
+    """
+    Atomically replace a JSON file.
+    """
+    with atomic_write(path) as f:
+        json.dump(obj, f, **kwargs)
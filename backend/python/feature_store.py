@@ -0,0 +1,140 @@
+import os
+import glob
+import logging
+import pathlib
+import threading
+from collections import OrderedDict
+
+import joblib
+
+import market_data
+from atomic_io import atomic_write
+from single_flight import single_flight
+
+CURRENT_DIR = pathlib.Path(__file__).parent
+STORE_DIR = CURRENT_DIR / 'cache' / 'features'
+
+# Feature frames kept in memory; the least recently used are evicted first
+MEMORY_ENTRIES = 32
+# Set FEATURE_STORE_DISK=0 to keep feature frames in memory only
+DISK_ENABLED = os.environ.get('FEATURE_STORE_DISK', '1') == '1'
+
+
+class FeatureStore:
+    """
+    Computed feature frames keyed by (ticker, interval, period, data
+    fingerprint, feature-set version), held in an in-memory LRU and on disk, so training,
+    inference and batch tools compute indicators once per version of the data.
+
+    The store does not know how features are computed: `builder(raw, interval)`
+    turns a provider history frame into the feature frame, and `version`
+    changes whenever the builder's output would.
+
+    Usage:
+        store = FeatureStore(build_feature_frame, version=FEATURE_SET_VERSION)
+        data = store.get('TCS.NS', '1d', raw, period='1y')
+    """
+
+    def __init__(self, builder, version, directory=STORE_DIR, memory_entries=MEMORY_ENTRIES,
+                 persist=DISK_ENABLED):
+        self.builder = builder
+        self.version = version
+        self.directory = pathlib.Path(directory)
+        self.memory_entries = memory_entries
+        self.persist = persist
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+    def key(self, ticker, interval, raw, period='max'):
+        """
+        Store key for a history frame: its last bar and content hash pin the data version.
+        """
+        watermark = raw.index[-1].strftime('%Y%m%d%H%M') if len(raw) else 'empty'
+        return (ticker, interval, period, watermark, market_data.frame_fingerprint(raw), self.version)
+
+    def _path(self, key):
+        ticker, interval, period, watermark, fingerprint, version = key
+        return self.directory / f'{ticker}_{interval}_{period}_v{version}_{watermark}_{fingerprint}.pkl'
+
+    def _remember(self, key, frame):
+        with self._lock:
+            self._memory[key] = frame
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, ticker, interval, raw, period='max'):
+        """
+        Feature frame for a ticker's history over `period`, computed by the
+        builder only when neither memory nor disk holds it for this exact data.
+        Each period is cached separately. The frame is shared between callers
+        and must be treated as read-only.
+        """
+        key = self.key(ticker, interval, raw, period)
+        with self._lock:
+            frame = self._memory.get(key)
+            if frame is not None:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return frame
+
+        frame = self._load(key)
+        if frame is not None:
+            return frame
+        if not self.persist:
+            return self._build(key, raw)
+
+        # One build per ticker and data version across concurrent processes;
+        # a caller that waited finds the winner's frame on disk
+        with single_flight(f'features:{ticker}:{interval}'):
+            frame = self._load(key)
+            if frame is None:
+                frame = self._build(key, raw)
+            return frame
+
+    def _load(self, key):
+        path = self._path(key)
+        if self.persist and path.exists():
+            try:
+                frame = joblib.load(path)
+                self.stats['disk_hits'] += 1
+                self._remember(key, frame)
+                return frame
+            except Exception as e:
+                logging.warning(f"Discarding unreadable feature cache {path.name}: {e}")
+        return None
+
+    def _build(self, key, raw):
+        self.stats['misses'] += 1
+        frame = self.builder(raw, key[1])
+        self._remember(key, frame)
+        if self.persist:
+            self._save(key, frame)
+        return frame
+
+    def _save(self, key, frame):
+        path = self._path(key)
+        ticker, interval, period = key[:3]
+        try:
+            # Older versions of this ticker's features over the same period are superseded
+            for stale in glob.glob(str(self.directory / f'{glob.escape(ticker)}_{interval}_{period}_v*.pkl')):
+                if stale != str(path):
+                    os.remove(stale)
+            with atomic_write(path, 'wb') as f:
+                joblib.dump(frame, f)
+        except OSError as e:
+            logging.warning(f"Failed to persist features for {ticker}: {e}")
+
+    def invalidate(self, ticker=None):
+        """
+        Drop cached features for one ticker, or for every ticker.
+        """
+        with self._lock:
+            for key in [k for k in self._memory if ticker is None or k[0] == ticker]:
+                del self._memory[key]
+        if self.persist:
+            pattern = f'{glob.escape(ticker)}_*.pkl' if ticker else '*.pkl'
+            for path in glob.glob(str(self.directory / pattern)):
+                os.remove(path)
+
@@ -0,0 +1,207 @@
+import io
+import os
+import sys
+import json
+import hashlib
+import logging
+import pathlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import market_data
+from atomic_io import atomic_write, atomic_write_json
+
+# Longest run of business days without a bar accepted as exchange holidays
+MAX_GAP_BUSINESS_DAYS = 5
+# Smallest provider period covering a given number of days since the watermark
+FETCH_PERIODS = [(5, '5d'), (28, '1mo'), (90, '3mo'), (180, '6mo'), (365, '1y'),
+                 (730, '2y'), (1825, '5y'), (3650, '10y')]
+DEFAULT_WORKERS = 8
+
+NSE_COLUMNS = ['Date', 'Symbol', 'Series', 'Prev Close', 'Open', 'High', 'Low', 'Last', 'Close',
+               'VWAP', 'Volume', 'Turnover', 'Trades', 'Deliverable Volume', '%Deliverble']
+
+
+def symbol_to_ticker(symbol):
+    """
+    Provider ticker for a bundled NSE symbol, e.g. TCS -> TCS.NS.
+    """
+    return f'{symbol}.NS'
+
+
+def fetch_period(last_date, today=None):
+    """
+    Smallest provider period that still reaches back to the watermark.
+    """
+    if last_date is None:
+        return 'max'
+    days = ((today or pd.Timestamp.today().normalize()) - last_date).days + 1
+    for max_days, period in FETCH_PERIODS:
+        if days <= max_days:
+            return period
+    return 'max'
+
+
+def normalize_bars(hist):
+    """
+    Provider history to tz-naive daily bars, sorted, deduplicated (latest wins).
+    """
+    bars = hist[market_data.OHLCV_COLUMNS].copy()
+    index = pd.DatetimeIndex(bars.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    bars.index = index.normalize()
+    bars = bars[~bars.index.duplicated(keep='last')].sort_index()
+    return bars.dropna()
+
+
+def validate_bars(bars, last_date=None):
+    """
+    Check new bars before they are appended. Returns a list of problems
+    (empty when the bars are fine): non-increasing dates, gaps longer than
+    holidays explain, and impossible prices.
+    """
+    issues = []
+    dates = bars.index
+    if last_date is not None and len(dates) and dates[0] <= last_date:
+        issues.append(f"first new bar {dates[0].date()} is not after watermark {last_date.date()}")
+    if not dates.is_monotonic_increasing or dates.has_duplicates:
+        issues.append("dates are not strictly increasing")
+
+    all_dates = dates if last_date is None else dates.insert(0, last_date)
+    if len(all_dates) > 1:
+        day_values = all_dates.values.astype('datetime64[D]')
+        gaps = np.busday_count(day_values[:-1], day_values[1:])
+        for i in np.flatnonzero(gaps > MAX_GAP_BUSINESS_DAYS):
+            issues.append(f"gap of {gaps[i]} business days after {pd.Timestamp(day_values[i]).date()}")
+
+    if (bars[['Open', 'High', 'Low', 'Close']] <= 0).any().any():
+        issues.append("non-positive prices")
+    if (bars['High'] < bars['Low']).any():
+        issues.append("high below low")
+    return issues
+
+
+def to_nse_rows(bars, symbol, prev_close, columns):
+    """
+    Shape OHLCV bars like the bundled NSE CSVs; fields the provider does not
+    supply (VWAP, turnover, deliverables) are left empty, as in the older
+    bundled rows; consumers drop bars only for missing OHLCV.
+    """
+    rows = pd.DataFrame(index=range(len(bars)), columns=columns)
+    rows['Date'] = bars.index.strftime('%Y-%m-%d')
+    rows['Symbol'] = symbol
+    rows['Series'] = 'EQ'
+    closes = bars['Close'].values
+    rows['Prev Close'] = np.concatenate([[prev_close], closes[:-1]])
+    for column in ['Open', 'High', 'Low', 'Close']:
+        rows[column] = bars[column].round(2).values
+    rows['Last'] = rows['Close']
+    rows['Volume'] = bars['Volume'].astype('int64').values
+    return rows[columns]
+
+
+def ingest_symbol(symbol, provider, data_dir=market_data.DATA_DIR, allow_gaps=False):
+    """
+    Append the bars a provider has beyond the symbol's last stored date, after
+    deduplication and validation, with an atomic rewrite of the CSV.
+    Returns a report entry with the new watermark and content hash.
+    """
+    path = pathlib.Path(data_dir) / f'{symbol}.csv'
+    with open(path, 'rb') as f:
+        content = f.read()
+
+    existing = pd.read_csv(io.BytesIO(content)) if content.strip() else pd.DataFrame(columns=NSE_COLUMNS)
+    columns = list(existing.columns) if len(existing.columns) else NSE_COLUMNS
+    last_date = pd.Timestamp(existing['Date'].iloc[-1]) if len(existing) else None
+    prev_close = float(existing['Close'].iloc[-1]) if len(existing) else np.nan
+
+    report = {'symbol': symbol, 'added': 0, 'status': 'unchanged', 'issues': []}
+    try:
+        hist = provider.history(symbol_to_ticker(symbol), period=fetch_period(last_date), interval='1d')
+    except Exception as e:
+        report.update(status='failed', issues=[str(e)])
+        return report
+
+    bars = normalize_bars(hist)
+    if last_date is not None:
+        bars = bars[bars.index > last_date]
+
+    if not bars.empty:
+        issues = validate_bars(bars, last_date)
+        blocking = [i for i in issues if not (allow_gaps and i.startswith('gap'))]
+        if blocking:
+            report.update(status='rejected', issues=issues)
+            return report
+
+        rows = to_nse_rows(bars, symbol, prev_close, columns)
+        # An empty file has no header line yet, whatever columns were assumed for it
+        has_header = bool(content.strip())
+        appended = rows.to_csv(index=False, header=not has_header).encode()
+        if not has_header:
+            content = b''
+        elif not content.endswith(b'\n'):
+            content += b'\n'
+        content += appended
+        with atomic_write(path, 'wb') as f:
+            f.write(content)
+        last_date = bars.index[-1]
+        report.update(status='updated', added=len(bars), issues=issues)
+
+    stat = os.stat(path)
+    report.update({
+        'watermark': str(last_date.date()) if last_date is not None else None,
+        'rows': int(len(existing) + report['added']),
+        'sha256': hashlib.sha256(content).hexdigest()[:16],
+        'size': stat.st_size,
+        'mtime': stat.st_mtime
+    })
+    return report
+
+
+def ingest_all(symbols=None, provider=None, data_dir=market_data.DATA_DIR, workers=DEFAULT_WORKERS,
+               allow_gaps=False):
+    """
+    Ingest new bars for every symbol in parallel and publish the manifest of
+    per-symbol watermarks and content hashes that downstream caches key on.
+    """
+    provider = provider or market_data.get_provider()
+    data_dir = pathlib.Path(data_dir)
+    symbols = symbols or market_data.CsvProvider(data_dir).symbols()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        reports = list(pool.map(lambda s: ingest_symbol(s, provider, data_dir, allow_gaps), symbols))
+
+    manifest = dict(market_data.read_manifest(data_dir))
+    for report in reports:
+        if 'sha256' in report:
+            manifest[report['symbol']] = {
+                key: report[key] for key in ('watermark', 'rows', 'sha256', 'size', 'mtime')
+            }
+        if report['status'] in ('rejected', 'failed'):
+            logging.warning(f"Ingestion {report['status']} for {report['symbol']}: {report['issues']}")
+    atomic_write_json(data_dir / market_data.MANIFEST_NAME, manifest, indent=1, sort_keys=True)
+    return reports
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Append new daily bars to the NSE CSVs in backend/data')
+    parser.add_argument('--symbols', type=str, nargs='+', default=None, help='Only these symbols')
+    parser.add_argument('--provider', type=str, default=None, choices=sorted(market_data.PROVIDERS),
+                        help='Market data provider (default: $MARKET_DATA_PROVIDER or yahoo)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Symbols fetched in parallel')
+    parser.add_argument('--allow-gaps', action='store_true', help='Append even if bars leave an unexplained gap')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    reports = ingest_all(args.symbols, market_data.get_provider(args.provider), workers=args.workers,
+                         allow_gaps=args.allow_gaps)
+    summary = {status: sum(r['status'] == status for r in reports)
+               for status in ('updated', 'unchanged', 'rejected', 'failed')}
+    print(json.dumps({'summary': summary, 'symbols': reports}))
+    sys.exit(1 if summary['failed'] or summary['rejected'] else 0)
@@ -0,0 +1,296 @@
+import os
+import json
+import hashlib
+import logging
+import pathlib
+from functools import lru_cache
+
+import pandas as pd
+
+CURRENT_DIR = pathlib.Path(__file__).parent
+# Bundled NSE end-of-day history
+DATA_DIR = CURRENT_DIR.parent / 'data'
+# Per-symbol watermarks and content hashes published by ingest.py
+MANIFEST_NAME = 'manifest.json'
+# Recorded provider responses for deterministic offline runs
+FIXTURES_DIR = pathlib.Path(os.environ.get('MARKET_DATA_FIXTURES', CURRENT_DIR / 'fixtures'))
+
+# Provider used when none is requested explicitly: yahoo, csv, replay or record
+DEFAULT_PROVIDER = os.environ.get('MARKET_DATA_PROVIDER', 'yahoo')
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+PERIOD_OFFSETS = {
+    '1d': pd.DateOffset(days=1),
+    '5d': pd.DateOffset(days=5),
+    '1mo': pd.DateOffset(months=1),
+    '60d': pd.DateOffset(days=60),
+    '3mo': pd.DateOffset(months=3),
+    '6mo': pd.DateOffset(months=6),
+    '1y': pd.DateOffset(years=1),
+    '2y': pd.DateOffset(years=2),
+    '5y': pd.DateOffset(years=5),
+    '10y': pd.DateOffset(years=10),
+}
+
+RESAMPLE_RULES = {'1wk': 'W-FRI', '1mo': 'ME'}
+
+
+def slice_period(df, period):
+    """
+    Return the trailing `period` of a history frame, anchored at its last bar
+    so local and replayed data slice the same way regardless of today's date.
+    """
+    if df.empty or period in ('max', None):
+        return df
+    if period == 'ytd':
+        start = pd.Timestamp(year=df.index[-1].year, month=1, day=1, tz=df.index.tz)
+        return df[df.index >= start]
+    if period not in PERIOD_OFFSETS:
+        raise ValueError(f"Unsupported period: {period}")
+    return df[df.index > df.index[-1] - PERIOD_OFFSETS[period]]
+
+
+def covered_period(df, periods):
+    """
+    Return the longest of `periods` (ordered longest first) that the frame
+    fully spans, or None if it is shorter than all of them.
+    """
+    if df.empty:
+        return None
+    # Allow for weekends and holidays at the start of the window
+    start = df.index[0] - pd.Timedelta(days=7)
+    for period in periods:
+        if df.index[-1] - PERIOD_OFFSETS[period] >= start:
+            return period
+    return None
+
+
+def resample_ohlcv(df, interval):
+    """
+    Aggregate daily bars into weekly or monthly bars.
+    """
+    if interval == '1d':
+        return df
+    if interval not in RESAMPLE_RULES:
+        raise ValueError(f"Interval '{interval}' is not available from daily data")
+    return df.resample(RESAMPLE_RULES[interval]).agg({
+        'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'
+    }).dropna()
+
+
+@lru_cache(maxsize=64)
+def _read_ohlcv_csv(path, mtime):
+    # mtime is part of the cache key so rewritten files are picked up
+    df = pd.read_csv(path)
+    if df.empty or 'Date' not in df.columns:
+        return pd.DataFrame(columns=OHLCV_COLUMNS, index=pd.DatetimeIndex([], name='Date'))
+    df['Date'] = pd.to_datetime(df['Date'])
+    df = df.set_index('Date').sort_index()
+    return df[OHLCV_COLUMNS].dropna()
+
+
+def read_ohlcv_csv(path):
+    """
+    Read a CSV with a Date column and OHLCV columns into a yfinance-shaped frame.
+    Results are cached until the file changes on disk.
+    """
+    path = str(path)
+    return _read_ohlcv_csv(path, os.path.getmtime(path))
+
+
+@lru_cache(maxsize=256)
+def _file_sha256(path, mtime, size):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def file_fingerprint(path):
+    """
+    Short content hash of a file, cached until it changes on disk.
+    """
+    path = str(path)
+    stat = os.stat(path)
+    return _file_sha256(path, stat.st_mtime, stat.st_size)
+
+
+def frame_fingerprint(df):
+    """
+    Short content hash of a history frame, for providers without files on disk.
+    """
+    hashed = pd.util.hash_pandas_object(df, index=True).values
+    return hashlib.sha256(hashed.tobytes()).hexdigest()[:16]
+
+
+@lru_cache(maxsize=4)
+def _read_manifest(path, mtime):
+    with open(path) as f:
+        return json.load(f)
+
+
+def read_manifest(data_dir=DATA_DIR):
+    """
+    Return the ingestion manifest ({symbol: {watermark, rows, sha256, ...}}), or {} if none.
+    """
+    path = pathlib.Path(data_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    return _read_manifest(str(path), os.path.getmtime(path))
+
+
+class MarketDataProvider:
+    """
+    Source of OHLCV history. Implementations return a frame indexed by
+    Date with Open/High/Low/Close/Volume columns, like yfinance does.
+    """
+    name = 'base'
+
+    def history(self, ticker, period='1y', interval='1d'):
+        raise NotImplementedError
+
+    def fingerprint(self, ticker, period='1y', interval='1d'):
+        """
+        Content hash of the data history() would return; changes whenever it does.
+        """
+        return frame_fingerprint(self.history(ticker, period=period, interval=interval))
+
+
+class YahooProvider(MarketDataProvider):
+    """
+    Live data from Yahoo Finance (one network round trip per call).
+    """
+    name = 'yahoo'
+
+    def history(self, ticker, period='1y', interval='1d'):
+        import yfinance as yf
+        return yf.Ticker(ticker).history(period=period, interval=interval)
+
+
+class CsvProvider(MarketDataProvider):
+    """
+    Offline data from the bundled NSE CSVs. `TCS.NS` and `TCS` both map to TCS.csv.
+    """
+    name = 'csv'
+
+    def __init__(self, data_dir=DATA_DIR):
+        self.data_dir = pathlib.Path(data_dir)
+
+    def resolve_path(self, ticker):
+        symbol = ticker.upper()
+        if symbol.endswith('.NS'):
+            symbol = symbol[:-3]
+        path = self.data_dir / f'{symbol}.csv'
+        if not path.exists():
+            raise ValueError(f"No local data for ticker: {ticker}")
+        return path
+
+    def symbols(self):
+        """
+        List the symbols that have price history in the data directory.
+        """
+        return sorted(
+            path.stem for path in self.data_dir.glob('*.csv')
+            if path.stem != 'stock_metadata'
+        )
+
+    def history(self, ticker, period='1y', interval='1d'):
+        df = resample_ohlcv(read_ohlcv_csv(self.resolve_path(ticker)), interval)
+        return slice_period(df, period)
+
+    def fingerprint(self, ticker, period='1y', interval='1d'):
+        """
+        Content hash of the symbol's CSV, taken from the ingestion manifest when it
+        is current and hashed from the file otherwise. Covers every period/interval.
+        """
+        path = self.resolve_path(ticker)
+        entry = read_manifest(self.data_dir).get(path.stem)
+        stat = os.stat(path)
+        if entry and entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime:
+            return entry['sha256']
+        return file_fingerprint(path)
+
+    def watermark(self, ticker):
+        """
+        Date of the last bar on disk for a symbol, or None if it has none.
+        """
+        path = self.resolve_path(ticker)
+        entry = read_manifest(self.data_dir).get(path.stem)
+        if entry and entry.get('size') == os.stat(path).st_size:
+            return entry['watermark']
+        hist = read_ohlcv_csv(path)
+        return str(hist.index[-1].date()) if not hist.empty else None
+
+
+class ReplayProvider(MarketDataProvider):
+    """
+    Replays responses recorded by RecordingProvider from the fixtures directory.
+    """
+    name = 'replay'
+
+    def __init__(self, fixtures_dir=FIXTURES_DIR):
+        self.fixtures_dir = pathlib.Path(fixtures_dir)
+
+    def fixture_path(self, ticker, interval):
+        return self.fixtures_dir / f'{ticker.upper()}_{interval}.csv'
+
+    def history(self, ticker, period='1y', interval='1d'):
+        path = self.fixture_path(ticker, interval)
+        if not path.exists():
+            raise ValueError(f"No recorded fixture for {ticker} ({interval}) at {path}")
+        return slice_period(read_ohlcv_csv(path), period)
+
+
+class RecordingProvider(ReplayProvider):
+    """
+    Fetches through another provider and records each response as a fixture.
+    """
+    name = 'record'
+
+    def __init__(self, inner=None, fixtures_dir=FIXTURES_DIR):
+        super().__init__(fixtures_dir)
+        self.inner = inner or YahooProvider()
+
+    def history(self, ticker, period='1y', interval='1d'):
+        hist = self.inner.history(ticker, period=period, interval=interval)
+        if not hist.empty:
+            os.makedirs(self.fixtures_dir, exist_ok=True)
+            recorded = hist[OHLCV_COLUMNS].copy()
+            recorded.index = recorded.index.tz_localize(None) if recorded.index.tz is not None else recorded.index
+            recorded.index.name = 'Date'
+            recorded.to_csv(self.fixture_path(ticker, interval))
+        return hist
+
+
+PROVIDERS = {
+    'yahoo': YahooProvider,
+    'csv': CsvProvider,
+    'replay': ReplayProvider,
+    'record': RecordingProvider,
+}
+
+_instances = {}
+
+
+def get_provider(name=None):
+    """
+    Return the provider registered under `name` (default: MARKET_DATA_PROVIDER).
+    """
+    name = name or DEFAULT_PROVIDER
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown market data provider '{name}'. Choose from: {', '.join(PROVIDERS)}")
+    if name not in _instances:
+        _instances[name] = PROVIDERS[name]()
+    return _instances[name]
+
+
+def set_default_provider(name):
+    """
+    Change the provider used when callers do not name one.
+    """
+    global DEFAULT_PROVIDER
+    get_provider(name)
+    DEFAULT_PROVIDER = name
+    logging.info(f"Using market data provider '{name}'")
@@ -0,0 +1,315 @@
+import os
+import sys
+import json
+import time
+import logging
+import pathlib
+import argparse
+
+import joblib
+import numpy as np
+from sklearn.decomposition import PCA
+from sklearn.neighbors import KDTree
+
+import market_data
+from atomic_io import atomic_write, atomic_write_json
+
+CURRENT_DIR = pathlib.Path(__file__).parent
+INDEX_DIR = CURRENT_DIR / 'cache' / 'pattern_index'
+
+# Length of the return windows being compared, in bars
+WINDOW = 60
+# PCA dimensions kept per window (None stores the full normalized window)
+N_COMPONENTS = 16
+# Windows sampled to fit the PCA basis
+PCA_SAMPLE = 50_000
+# Bars ahead for which the returns following each match are reported
+FORWARD_HORIZONS = [5, 20]
+
+
+def window_vectors(closes, window=WINDOW, first_end=None):
+    """
+    Z-normalized log-return windows ending at every close from `first_end`
+    onwards (default: the first close with a full window behind it).
+    Returns (vectors of shape (n_windows, window), end positions in closes).
+    """
+    first_end = window if first_end is None else max(first_end, window)
+    closes = np.asarray(closes, dtype=np.float64)
+    if len(closes) <= first_end:
+        return np.empty((0, window), dtype=np.float32), np.empty(0, dtype=np.int64)
+
+    returns = np.diff(np.log(closes[first_end - window:]))
+    windows = np.lib.stride_tricks.sliding_window_view(returns, window)
+    std = windows.std(axis=1, keepdims=True)
+    vectors = (windows - windows.mean(axis=1, keepdims=True)) / np.where(std > 0, std, 1)
+    return vectors.astype(np.float32), np.arange(first_end, len(closes))
+
+
+class PatternIndex:
+    """
+    Nearest-neighbour index over normalized price-return windows of every
+    symbol. Vectors are stored as a flat float32 matrix on disk; the meta file
+    is written last and records how many rows are valid, so appends are safe.
+
+    Usage:
+        index = PatternIndex.open()
+        index.query('TCS', k=10)
+    """
+
+    def __init__(self, index_dir=INDEX_DIR, window=WINDOW, n_components=N_COMPONENTS):
+        self.index_dir = pathlib.Path(index_dir)
+        self.window = window
+        self.n_components = n_components
+        self.symbols = []
+        # symbol -> {'rows': closes indexed, 'last_date': date of the last indexed close,
+        #            'fingerprint': content hash of the data indexed}
+        self.watermarks = {}
+        self.count = 0
+        self.pca = None
+        self._tree = None
+        self.provider = market_data.get_provider('csv')
+
+    @property
+    def dim(self):
+        return self.n_components or self.window
+
+    def _path(self, name):
+        return self.index_dir / name
+
+    def _closes(self, symbol):
+        hist = self.provider.history(symbol, period='max')
+        return hist['Close'].values, hist.index
+
+    def _project(self, vectors):
+        if self.pca is None or len(vectors) == 0:
+            return vectors
+        return self.pca.transform(vectors).astype(np.float32)
+
+    def _append(self, vectors, keys):
+        with open(self._path('vectors.f32'), 'r+b' if self.count else 'wb') as f:
+            f.seek(self.count * self.dim * 4)
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            f.truncate()
+        with open(self._path('keys.i32'), 'r+b' if self.count else 'wb') as f:
+            f.seek(self.count * 2 * 4)
+            f.write(np.ascontiguousarray(keys, dtype=np.int32).tobytes())
+            f.truncate()
+        self.count += len(vectors)
+        self._tree = None
+
+    def _save_meta(self):
+        meta = {
+            'window': self.window,
+            'n_components': self.n_components,
+            'count': self.count,
+            'symbols': self.symbols,
+            'watermarks': self.watermarks,
+            'updated_at': time.time()
+        }
+        atomic_write_json(self._path('meta.json'), meta)
+
+    def build(self, symbols=None):
+        """
+        Index every window of every symbol from scratch.
+        """
+        os.makedirs(self.index_dir, exist_ok=True)
+        self.symbols, self.watermarks, self.count = [], {}, 0
+        # A tree saved for the old index could match the new window count
+        if self._path('tree.pkl').exists():
+            os.remove(self._path('tree.pkl'))
+
+        per_symbol = []
+        for symbol in symbols or self.provider.symbols():
+            try:
+                closes, dates = self._closes(symbol)
+            except Exception as e:
+                logging.warning(f"Skipping {symbol} in pattern index: {e}")
+                continue
+            vectors, ends = window_vectors(closes, self.window)
+            if len(vectors) == 0:
+                logging.warning(f"Skipping {symbol} in pattern index: not enough history")
+                continue
+            per_symbol.append((symbol, vectors, ends, len(closes), str(dates[-1]), self.provider.fingerprint(symbol)))
+
+        if self.n_components:
+            all_vectors = np.concatenate([entry[1] for entry in per_symbol])
+            rng = np.random.default_rng(42)
+            sample = all_vectors[rng.choice(len(all_vectors), min(PCA_SAMPLE, len(all_vectors)), replace=False)]
+            self.pca = PCA(n_components=self.n_components, random_state=42).fit(sample)
+            with atomic_write(self._path('pca.pkl'), 'wb') as f:
+                joblib.dump(self.pca, f)
+            del all_vectors
+
+        vectors, keys = [], []
+        for symbol, symbol_vectors, ends, rows, last_date, fingerprint in per_symbol:
+            symbol_id = len(self.symbols)
+            self.symbols.append(symbol)
+            vectors.append(self._project(symbol_vectors))
+            keys.append(np.column_stack([np.full(len(ends), symbol_id), ends]))
+            self.watermarks[symbol] = {'rows': rows, 'last_date': last_date, 'fingerprint': fingerprint}
+
+        # Other processes may have the old files memory-mapped, so new files
+        # are swapped in rather than truncated and rewritten in place
+        with atomic_write(self._path('vectors.f32'), 'wb') as f:
+            f.write(np.ascontiguousarray(np.concatenate(vectors), dtype=np.float32).tobytes())
+        with atomic_write(self._path('keys.i32'), 'wb') as f:
+            f.write(np.ascontiguousarray(np.concatenate(keys), dtype=np.int32).tobytes())
+        self.count = sum(len(v) for v in vectors)
+        self._tree = None
+
+        self._save_meta()
+        logging.info(f"Pattern index built: {self.count} windows from {len(self.symbols)} symbols")
+        return self
+
+    def update(self):
+        """
+        Append windows for bars added since the last build or update. The PCA
+        basis is kept. Returns {symbol: windows added}; a symbol whose history
+        was rewritten rather than appended triggers a full rebuild.
+        """
+        added = {}
+        for symbol in self.provider.symbols():
+            mark = self.watermarks.get(symbol)
+            try:
+                fingerprint = self.provider.fingerprint(symbol)
+                # Unchanged content hash: nothing to read or index
+                if mark is not None and mark.get('fingerprint') == fingerprint:
+                    continue
+                closes, dates = self._closes(symbol)
+            except Exception:
+                continue
+            if mark is not None:
+                if len(closes) < mark['rows'] or str(dates[mark['rows'] - 1]) != mark['last_date']:
+                    logging.warning(f"History of {symbol} changed, rebuilding the pattern index")
+                    self.build()
+                    return {s: -1 for s in self.symbols}
+                first_end = mark['rows']
+            else:
+                first_end = None
+
+            vectors, ends = window_vectors(closes, self.window, first_end)
+            if len(vectors) == 0:
+                continue
+            if symbol not in self.symbols:
+                self.symbols.append(symbol)
+            symbol_id = self.symbols.index(symbol)
+            self._append(self._project(vectors), np.column_stack([np.full(len(ends), symbol_id), ends]))
+            self.watermarks[symbol] = {'rows': len(closes), 'last_date': str(dates[-1]), 'fingerprint': fingerprint}
+            added[symbol] = len(vectors)
+
+        if added:
+            self._save_meta()
+        return added
+
+    @classmethod
+    def open(cls, index_dir=INDEX_DIR):
+        """
+        Load an existing index, or build one from backend/data if none exists.
+        """
+        index_dir = pathlib.Path(index_dir)
+        if not (index_dir / 'meta.json').exists():
+            return cls(index_dir).build()
+
+        with open(index_dir / 'meta.json') as f:
+            meta = json.load(f)
+        index = cls(index_dir, meta['window'], meta['n_components'])
+        index.symbols = meta['symbols']
+        index.watermarks = meta['watermarks']
+        index.count = meta['count']
+        if index.n_components:
+            index.pca = joblib.load(index_dir / 'pca.pkl')
+        return index
+
+    def vectors(self):
+        return np.memmap(self._path('vectors.f32'), dtype=np.float32, mode='r', shape=(self.count, self.dim))
+
+    def keys(self):
+        return np.memmap(self._path('keys.i32'), dtype=np.int32, mode='r', shape=(self.count, 2))
+
+    @property
+    def tree(self):
+        """
+        KDTree over the stored vectors, loaded from disk when it was saved for
+        the current number of windows and rebuilt (and saved) otherwise.
+        """
+        if self._tree is None:
+            tree_path = self._path('tree.pkl')
+            if tree_path.exists():
+                saved = joblib.load(tree_path)
+                if saved['count'] == self.count:
+                    self._tree = saved['tree']
+            if self._tree is None:
+                self._tree = KDTree(np.asarray(self.vectors()))
+                with atomic_write(tree_path, 'wb') as f:
+                    joblib.dump({'count': self.count, 'tree': self._tree}, f)
+        return self._tree
+
+    def query(self, symbol, k=10, horizons=FORWARD_HORIZONS, exclude_self=True):
+        """
+        Top-k historical windows most similar to `symbol`'s latest window, with
+        the returns that followed each match. Windows of the same symbol that
+        overlap the query window are excluded when exclude_self is set.
+        """
+        closes, dates = self._closes(symbol)
+        query_vectors, _ = window_vectors(closes, self.window, len(closes) - 1)
+        if len(query_vectors) == 0:
+            raise ValueError(f"Not enough history to query {symbol}")
+        query = self._project(query_vectors)
+
+        keys = self.keys()
+        self_id = self.symbols.index(symbol) if symbol in self.symbols else -1
+        n_candidates = k
+        while True:
+            n_candidates = min(n_candidates * 4, self.count)
+            distances, indices = self.tree.query(query, k=n_candidates)
+            candidate_keys = np.asarray(keys[indices[0]])
+            keep = np.ones(len(candidate_keys), dtype=bool)
+            if exclude_self:
+                keep &= ~((candidate_keys[:, 0] == self_id) & (candidate_keys[:, 1] > len(closes) - 1 - self.window))
+            if keep.sum() >= k or n_candidates == self.count:
+                break
+        matches = [(float(distance), int(symbol_id), int(end)) for distance, (symbol_id, end)
+                   in zip(distances[0][keep][:k], candidate_keys[keep][:k])]
+
+        results = []
+        for distance, symbol_id, end in matches:
+            match_closes, match_dates = self._closes(self.symbols[symbol_id])
+            results.append({
+                'symbol': self.symbols[symbol_id],
+                'start_date': str(match_dates[end - self.window].date()),
+                'end_date': str(match_dates[end].date()),
+                'distance': round(distance, 4),
+                'forward_returns': {
+                    f'{h}d': (float(match_closes[end + h] / match_closes[end] - 1)
+                              if end + h < len(match_closes) else None)
+                    for h in horizons
+                }
+            })
+        return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Historical price-pattern similarity search')
+    parser.add_argument('--build', action='store_true', help='Rebuild the index from backend/data')
+    parser.add_argument('--update', action='store_true', help='Append windows for newly added bars')
+    parser.add_argument('--query', type=str, default=None, help='Symbol whose latest window to match')
+    parser.add_argument('--k', type=int, default=10, help='Number of matches to return')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    try:
+        args = parse_args()
+        index = PatternIndex().build() if args.build else PatternIndex.open()
+        output = {'windows': index.count, 'symbols': len(index.symbols)}
+        if args.update:
+            output['updated'] = index.update()
+        if args.query:
+            start = time.perf_counter()
+            output['matches'] = index.query(args.query, args.k)
+            output['query_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        print(json.dumps(output))
+        sys.exit(0)
+    except Exception as e:
+        print(json.dumps({'error': str(e)}))
+        sys.exit(1)
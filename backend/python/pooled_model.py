@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import time
+import logging
+import pathlib
+import argparse
+from functools import lru_cache
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+from sklearn.model_selection import GroupKFold, StratifiedKFold, cross_val_score
+
+import market_data
+
+CURRENT_DIR = pathlib.Path(__file__).parent
+MODELS_DIR = CURRENT_DIR.parent / 'AI_models'
+
+# Artifacts live in their own directory under the models directory, where
+# per-ticker file names (any ticker, including 'UNIVERSE') cannot collide
+UNIVERSE_DIR_NAME = 'universe'
+
+# Features comparable across symbols: returns, ratios and bounded oscillators
+# as computed, plus price-level indicators normalized by price
+DIRECT_FEATURES = [
+    'Daily Return', 'Volatility', 'RSI', 'Price_to_MA50', 'Price_to_MA200',
+    'ROC_5', 'ROC_10', 'Volume_ROC', 'Stoch_K', 'Stoch_D'
+]
+UNIVERSE_FEATURES = DIRECT_FEATURES + ['MACD_pct', 'MACD_Hist_pct', 'ATR_pct', 'BB_width', 'BB_position',
+                                       'Volatility_to_mean']
+
+# Bars per labeled segment. Per-ticker models label volatility terciles within
+# the window they are served from, which for a 1y fetch is roughly the last
+# quarter once the 200-bar moving average has warmed up.
+SEGMENT_BARS = 63
+# Most recent segments taken from each symbol, to bound training size
+MAX_SEGMENTS_PER_SYMBOL = 40
+# Latest segments per held-out symbol scored in the evaluation
+EVAL_SEGMENTS_PER_SYMBOL = 3
+
+UNIVERSE_RF_PARAMS = {'n_estimators': 200, 'min_samples_leaf': 20, 'max_features': 'sqrt',
+                      'n_jobs': -1, 'random_state': 42}
+
+
+def universe_paths(models_dir=MODELS_DIR):
+    universe_dir = pathlib.Path(models_dir) / UNIVERSE_DIR_NAME
+    return {
+        'model': universe_dir / 'risk_model.pkl',
+        'scaler': universe_dir / 'scaler.pkl',
+        'metrics': universe_dir / 'model_metrics.json',
+        'evaluation': universe_dir / 'evaluation.json'
+    }
+
+
+def scale_free_features(data):
+    """
+    Universe model inputs for a labeled or unlabeled feature frame. Relative
+    volatility is measured against the frame's own mean, the same window the
+    risk labels are drawn from.
+    """
+    features = data[DIRECT_FEATURES].copy()
+    features['MACD_pct'] = data['MACD'] / data['Close']
+    features['MACD_Hist_pct'] = data['MACD_Hist'] / data['Close']
+    features['ATR_pct'] = data['ATR'] / data['Close']
+    band = data['BB_upper'] - data['BB_lower']
+    features['BB_width'] = band / data['BB_middle']
+    features['BB_position'] = (data['Close'] - data['BB_lower']) / band.where(band > 0)
+    features['Volatility_to_mean'] = data['Volatility'] / data['Volatility'].mean()
+    return features.replace([np.inf, -np.inf], np.nan).fillna(0.0)
+
+
+def is_available(interval='1d', models_dir=MODELS_DIR):
+    """
+    Whether a universe model can serve this interval (it is trained on daily bars).
+    """
+    paths = universe_paths(models_dir)
+    return interval == '1d' and paths['model'].exists() and paths['scaler'].exists()
+
+
+@lru_cache(maxsize=2)
+def _load(model_path, scaler_path, mtime):
+    return joblib.load(model_path), joblib.load(scaler_path)
+
+
+def load_universe_model(models_dir=MODELS_DIR):
+    """
+    Load the universe model and scaler once per version on disk.
+    Returns (model, scaler, features_used) like the per-ticker loader.
+    """
+    paths = universe_paths(models_dir)
+    model, scaler = _load(str(paths['model']), str(paths['scaler']), os.path.getmtime(paths['model']))
+    return model, scaler, UNIVERSE_FEATURES
+
+
+def symbol_segments(symbol, provider, max_segments=MAX_SEGMENTS_PER_SYMBOL):
+    """
+    Consecutive SEGMENT_BARS-bar segments of a symbol's daily history (most
+    recent last), each risk-labeled on its own like a per-ticker window.
+    Features are computed once over the full history.
+    """
+    import risk_analysis
+
+    data = risk_analysis.preprocess_data(provider.history(symbol, period='max'))
+    data = risk_analysis.add_features(data, '1d', copy=False).reset_index(drop=True)
+    first = len(data) % SEGMENT_BARS
+    starts = list(range(first, len(data) - SEGMENT_BARS + 1, SEGMENT_BARS))[-max_segments:]
+    return [risk_analysis.label_risk(data.iloc[start:start + SEGMENT_BARS]) for start in starts]
+
+
+def universe_dataset(symbols=None, provider=None):
+    """
+    Labeled segments for every symbol: {symbol: [segment frames]}.
+    """
+    provider = provider or market_data.get_provider('csv')
+    dataset = {}
+    for symbol in symbols or provider.symbols():
+        try:
+            segments = symbol_segments(symbol, provider)
+        except Exception as e:
+            logging.warning(f"Skipping {symbol} in universe model: {e}")
+            continue
+        if segments:
+            dataset[symbol] = segments
+    return dataset
+
+
+def _stack(segments):
+    frames = [scale_free_features(segment) for segment in segments]
+    labels = [segment['Risk Level'].values for segment in segments]
+    return pd.concat(frames).values, np.concatenate(labels)
+
+
+def fit_universe_model(dataset):
+    X, y = zip(*(_stack(segments) for segments in dataset.values()))
+    X, y = np.concatenate(X), np.concatenate(y)
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(**UNIVERSE_RF_PARAMS).fit(scaler.transform(X), y)
+    return model, scaler, len(y)
+
+
+def train_universe_model(symbols=None, models_dir=MODELS_DIR):
+    """
+    Train the pooled classifier on every symbol in backend/data and save it
+    in the universe directory next to the per-ticker models.
+    """
+    import risk_analysis
+
+    dataset = universe_dataset(symbols)
+    if not dataset:
+        raise ValueError("No symbols with enough history to train the universe model")
+    model, scaler, rows = fit_universe_model(dataset)
+
+    paths = universe_paths(models_dir)
+    risk_analysis.save_joblib(model, paths['model'])
+    risk_analysis.save_joblib(scaler, paths['scaler'])
+    risk_analysis.atomic_write_json(paths['metrics'], {
+        'features_used': UNIVERSE_FEATURES,
+        'interval': '1d',
+        'symbols': sorted(dataset),
+        'rows': rows,
+        'segment_bars': SEGMENT_BARS,
+        'params': {k: v for k, v in UNIVERSE_RF_PARAMS.items() if k != 'n_jobs'},
+        'feature_importance': {feature: float(importance) for feature, importance in
+                               zip(UNIVERSE_FEATURES, model.feature_importances_)},
+        'trained_at': time.time()
+    })
+    logging.info(f"Universe model trained on {rows} rows from {len(dataset)} symbols")
+    return model, scaler, dataset
+
+
+def evaluate_universe_model(dataset, folds=5, models_dir=MODELS_DIR):
+    """
+    Leave-symbols-out comparison with per-ticker models. Symbols are split
+    into folds; the pooled model is trained without a fold's symbols and
+    scored on their latest segments. Each of those segments is also scored
+    the way a per-ticker model is validated in production: cross-validated
+    accuracy of a forest trained on that segment's own full feature set.
+    """
+    import risk_analysis
+
+    symbols = sorted(dataset)
+    groups = np.arange(len(symbols))
+    per_symbol = {}
+    for train_idx, test_idx in GroupKFold(n_splits=min(folds, len(symbols))).split(groups, groups=groups):
+        model, scaler, _ = fit_universe_model({symbols[i]: dataset[symbols[i]] for i in train_idx})
+
+        for i in test_idx:
+            symbol = symbols[i]
+            pooled, per_ticker = [], []
+            for segment in dataset[symbol][-EVAL_SEGMENTS_PER_SYMBOL:]:
+                X, y = _stack([segment])
+                pooled.append(float((model.predict(scaler.transform(X)) == y).mean()))
+
+                classes, counts = np.unique(y, return_counts=True)
+                n_splits = min(5, counts.min())
+                if len(classes) > 1 and n_splits >= 2:
+                    X_ticker = StandardScaler().fit_transform(segment[risk_analysis.FEATURE_COLUMNS].values)
+                    cv = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=42)
+                    scores = cross_val_score(RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1),
+                                             X_ticker, y, cv=cv, scoring='accuracy')
+                    per_ticker.append(float(scores.mean()))
+            per_symbol[symbol] = {
+                'pooled_accuracy': float(np.mean(pooled)),
+                'per_ticker_accuracy': float(np.mean(per_ticker)) if per_ticker else None
+            }
+
+    compared = [e for e in per_symbol.values() if e['per_ticker_accuracy'] is not None]
+    report = {
+        'symbols': len(symbols),
+        'folds': min(folds, len(symbols)),
+        'segment_bars': SEGMENT_BARS,
+        'segments_per_symbol': EVAL_SEGMENTS_PER_SYMBOL,
+        'pooled_accuracy_mean': float(np.mean([e['pooled_accuracy'] for e in per_symbol.values()])),
+        'per_ticker_accuracy_mean': float(np.mean([e['per_ticker_accuracy'] for e in compared])) if compared else None,
+        'median_gap': float(np.median([e['per_ticker_accuracy'] - e['pooled_accuracy'] for e in compared]))
+                      if compared else None,
+        'per_symbol': per_symbol
+    }
+    risk_analysis.atomic_write_json(universe_paths(models_dir)['evaluation'], report, indent=2)
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Pooled risk model over every symbol in backend/data')
+    parser.add_argument('--symbols', type=str, nargs='+', default=None, help='Only these symbols')
+    parser.add_argument('--evaluate', action='store_true',
+                        help='Also write a leave-symbols-out comparison with per-ticker accuracy')
+    parser.add_argument('--folds', type=int, default=5, help='Symbol folds for the evaluation')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    try:
+        args = parse_args()
+        _, _, dataset = train_universe_model(args.symbols)
+        output = {'symbols': len(dataset)}
+        if args.evaluate:
+            report = evaluate_universe_model(dataset, args.folds)
+            output.update({k: v for k, v in report.items() if k != 'per_symbol'})
+        print(json.dumps(output))
+        sys.exit(0)
+    except Exception as e:
+        print(json.dumps({'error': str(e)}))
+        sys.exit(1)
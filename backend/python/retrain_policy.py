@@ -0,0 +1,140 @@
+import math
+import time
+
+import pandas as pd
+
+import market_data
+
+# Features compared for distribution drift; price-level features (MAs, bands,
+# ATR, OBV) trend with the price and would always look shifted
+DRIFT_FEATURES = [
+    'Daily Return', 'Volatility', 'RSI', 'Price_to_MA50', 'Price_to_MA200',
+    'ROC_5', 'ROC_10', 'Volume_ROC', 'Stoch_K', 'Stoch_D'
+]
+# Shift of a drift feature's mean over the last MIN_RECENT_BARS bars, in standard
+# deviations of MIN_RECENT_BARS-bar means over the training data, that warrants an update
+FEATURE_DRIFT_THRESHOLD = 3.0
+# Relative move of the volatility cutoffs between risk levels that warrants a retrain
+LABEL_QUANTILE_DRIFT = 0.2
+# Accuracy drop on bars after training that warrants an update (twice this: a retrain)
+ACCURACY_DROP_THRESHOLD = 0.15
+# Standard errors of the accuracy on the new bars a drop must exceed on top of the threshold
+ACCURACY_NOISE_SE = 2.0
+# Bars in the recent window whose feature means are compared (and fewest new bars scored)
+MIN_RECENT_BARS = 10
+# Models are fully retrained at least this often regardless of drift; older
+# models are never updated incrementally
+MAX_MODEL_AGE_DAYS = 30
+
+KEEP, UPDATE, RETRAIN = 'keep', 'update', 'retrain'
+
+
+def data_fingerprint(data):
+    """
+    Content hash of the bars a model is trained on.
+    """
+    return market_data.frame_fingerprint(data[['Date', 'Open', 'High', 'Low', 'Close', 'Volume']])
+
+
+def label_quantiles(data):
+    return data['Volatility'].quantile([0.33, 0.66]).tolist()
+
+
+def training_profile(data, features_used):
+    """
+    Statistics of the training data saved with the model metrics, against
+    which later data is compared.
+    """
+    drift_features = [f for f in DRIFT_FEATURES if f in features_used]
+    return {
+        'data_fingerprint': data_fingerprint(data),
+        'feature_means': data[drift_features].mean().to_dict(),
+        'feature_stds': data[drift_features].std().to_dict(),
+        # Spread of the statistic drift is measured with, which for smooth
+        # features is far below the per-bar standard deviation
+        'feature_mean_stds': data[drift_features].rolling(MIN_RECENT_BARS).mean().std().to_dict(),
+        'label_quantiles': label_quantiles(data)
+    }
+
+
+def drift_statistics(metrics, data, model, scaler, features_used):
+    """
+    Feature mean shift of the last MIN_RECENT_BARS bars and label-quantile
+    shift against the training profile, and accuracy on the bars that arrived
+    after training (None if too few).
+    """
+    new_bars = data[data['Date'] > pd.Timestamp(metrics['data_end'])] if 'data_end' in metrics else data.iloc[:0]
+    recent = data.iloc[-MIN_RECENT_BARS:]
+
+    shifts = {}
+    for name, mean in metrics['feature_means'].items():
+        std = metrics['feature_mean_stds'].get(name) or 0
+        if name in recent.columns and std > 0:
+            shifts[name] = abs(float(recent[name].mean()) - mean) / std
+    drifted = max(shifts, key=shifts.get) if shifts else None
+
+    old_q, new_q = metrics['label_quantiles'], label_quantiles(data)
+    quantile_shift = max((abs(new - old) / old for old, new in zip(old_q, new_q) if old > 0), default=0.0)
+
+    accuracy = None
+    if len(new_bars) >= MIN_RECENT_BARS:
+        predicted = model.predict(scaler.transform(new_bars[features_used].values))
+        accuracy = float((predicted == new_bars['Risk Level'].values).mean())
+
+    return {
+        'new_bars': int(len(new_bars)),
+        'max_feature_shift': round(shifts[drifted], 4) if drifted else 0.0,
+        'most_shifted_feature': drifted,
+        'label_quantile_shift': round(float(quantile_shift), 4),
+        'recent_accuracy': accuracy,
+        'training_accuracy': metrics.get('cv_accuracy_mean')
+    }
+
+
+def decide(metrics, data, model, scaler, features_used):
+    """
+    Decide whether a saved model is kept as is, updated incrementally, or
+    retrained from scratch. Returns {'action', 'reasons', 'statistics'}; the
+    reasons are human-readable and recorded with the model metrics.
+    """
+    if metrics is None or 'feature_means' not in metrics:
+        return {'action': RETRAIN, 'reasons': ['no training profile recorded'], 'statistics': {}}
+
+    if data_fingerprint(data) == metrics.get('data_fingerprint'):
+        return {'action': KEEP, 'reasons': ['training data unchanged'], 'statistics': {}}
+
+    age_days = (time.time() - metrics.get('last_full_retrain', 0)) / (24 * 60 * 60)
+    if age_days > MAX_MODEL_AGE_DAYS:
+        return {'action': RETRAIN, 'reasons': [f'last full retrain {age_days:.0f} days ago'], 'statistics': {}}
+
+    if 'feature_mean_stds' not in metrics:
+        return {'action': RETRAIN, 'reasons': [f'training profile has no {MIN_RECENT_BARS}-bar mean spread'],
+                'statistics': {}}
+
+    stats = drift_statistics(metrics, data, model, scaler, features_used)
+    retrain, update = [], []
+
+    if stats['label_quantile_shift'] > LABEL_QUANTILE_DRIFT:
+        retrain.append(f"risk-level volatility cutoffs moved {stats['label_quantile_shift']:.0%}")
+
+    if stats['recent_accuracy'] is not None and stats['training_accuracy'] is not None:
+        # Accuracy over a few new bars is noisy; only the drop beyond its sampling error counts
+        accuracy = stats['training_accuracy']
+        noise = ACCURACY_NOISE_SE * math.sqrt(accuracy * (1 - accuracy) / stats['new_bars'])
+        drop = accuracy - stats['recent_accuracy'] - noise
+        message = (f"accuracy on {stats['new_bars']} new bars {stats['recent_accuracy']:.2f} "
+                   f"vs {accuracy:.2f} in training")
+        if drop > 2 * ACCURACY_DROP_THRESHOLD:
+            retrain.append(message)
+        elif drop > ACCURACY_DROP_THRESHOLD:
+            update.append(message)
+
+    if stats['max_feature_shift'] > FEATURE_DRIFT_THRESHOLD:
+        update.append(f"{stats['most_shifted_feature']} shifted {stats['max_feature_shift']:.1f} std of "
+                      f"training {MIN_RECENT_BARS}-bar means")
+
+    if retrain:
+        return {'action': RETRAIN, 'reasons': retrain + update, 'statistics': stats}
+    if update:
+        return {'action': UPDATE, 'reasons': update, 'statistics': stats}
+    return {'action': KEEP, 'reasons': [f"no drift over {stats['new_bars']} new bars"], 'statistics': stats}
@@ -1,6 +1,5 @@
 import pandas as pd
 import numpy as np
-import yfinance as yf
 import pandas_ta as ta
 import joblib
 import os
@@ -11,6 +10,8 @@ import json
 import time
 import argparse
 import sys
+import cProfile
+import subprocess
 from functools import lru_cache
 from sklearn.model_selection import train_test_split, StratifiedKFold
 from sklearn.preprocessing import StandardScaler
@@ -18,6 +19,14 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import confusion_matrix, classification_report
 from sklearn.model_selection import GridSearchCV, cross_val_score
 
+import stage_timer
+import market_data
+import feature_store
+import retrain_policy
+import pooled_model
+from atomic_io import atomic_write, atomic_write_json
+from single_flight import single_flight
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -32,42 +41,159 @@ logging.basicConfig(
 CURRENT_DIR = pathlib.Path(__file__).parent
 # Go up one level to backend and then to AI_models
 MODELS_DIR = CURRENT_DIR.parent / 'AI_models'
+# Cached per-bar risk timelines
+TIMELINE_CACHE_DIR = CURRENT_DIR / 'cache' / 'timelines'
+
+# Serve tickers without a model of their own from the pooled universe model
+# (see pooled_model.py) instead of making the request wait for training
+UNIVERSE_COLD_START = os.environ.get('RISK_UNIVERSE_COLD_START', '1') == '1'
+# Train a cold ticker's own model in a detached process after serving it
+BACKGROUND_TRAINING = os.environ.get('RISK_BACKGROUND_TRAINING', '1') == '1'
+# One marker file per ticker and interval while a background trainer runs
+TRAINING_MARKER_DIR = CURRENT_DIR / 'cache' / 'training'
+# Markers older than this were left by a trainer that died and no longer block a new one
+TRAINING_MARKER_SECONDS = 2 * 60 * 60
+
+# Bars per trading year for daily and longer intervals
+TRADING_DAYS_PER_YEAR = 252
+BARS_PER_YEAR = {'1d': TRADING_DAYS_PER_YEAR, '5d': TRADING_DAYS_PER_YEAR / 5, '1wk': 52, '1mo': 12, '3mo': 4}
+# Minutes in a regular NSE session (09:15-15:30), used to size intraday bars
+TRADING_MINUTES_PER_DAY = 375
+INTRADAY_MINUTES = {'1m': 1, '2m': 2, '5m': 5, '15m': 15, '30m': 30, '60m': 60, '90m': 90, '1h': 60}
+# Yahoo Finance only serves limited intraday history (7 calendar days of 1m
+# bars, 60 of 2m-90m, 730 of hourly), so default to what it allows
+INTRADAY_DEFAULT_PERIODS = {'1m': '5d', '60m': '1y', '1h': '1y'}
+INTRADAY_FALLBACK_PERIOD = '60d'
+# Trading days in those default periods
+INTRADAY_HISTORY_DAYS = {'1m': 5, '60m': TRADING_DAYS_PER_YEAR, '1h': TRADING_DAYS_PER_YEAR}
+INTRADAY_FALLBACK_HISTORY_DAYS = 40
+VOLATILITY_WINDOW_DAYS = 21
+
+# Rows per feature-computation chunk; longer series are processed piecewise
+FEATURE_CHUNK_SIZE = 200_000
+# Extra bars replayed before each chunk so EMA-based indicators (RSI, MACD, ATR) converge
+CHUNK_EMA_WARMUP = 1_000
+
+# Incremental (warm-start) model updates
+# Trees grown on recent bars per update; the same number of oldest trees is dropped
+INCREMENTAL_NEW_TREES = 50
+# Most recent labeled bars the new trees are grown on
+INCREMENTAL_WINDOW_BARS = 126
+# Force a full grid-search retrain after this many updates (or once the model
+# is older than retrain_policy.MAX_MODEL_AGE_DAYS)
+MAX_INCREMENTAL_UPDATES = 8
+# Largest holdout accuracy drop an update may cause and still be kept
+UPDATE_ACCURACY_TOLERANCE = 0.02
+
+FEATURE_COLUMNS = [
+    'Daily Return', 'Volatility', 'MA50', 'MA200',
+    'RSI', 'MACD', 'MACD_Signal', 'MACD_Hist',
+    'BB_upper', 'BB_middle', 'BB_lower',
+    'Price_to_MA50', 'Price_to_MA200',
+    'ROC_5', 'ROC_10', 'ATR',
+    'Volume_ROC', 'OBV',
+    'Stoch_K', 'Stoch_D'
+]
+
+# Bump whenever preprocessing, features or labels change, so stored feature
+# frames computed by older code are not reused
+FEATURE_SET_VERSION = 1
+# Columns kept in stored feature frames
+FEATURE_FRAME_COLUMNS = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume'] + FEATURE_COLUMNS + ['Risk Level']
+
 def parse_args():
     parser = argparse.ArgumentParser(description='Stock Risk Analysis')
-    parser.add_argument('--ticker', type=str, required=True, help='Stock ticker symbol')
+    parser.add_argument('--ticker', type=str, help='Stock ticker symbol')
     parser.add_argument('--portfolio', type=str, default='[]', help='JSON array of portfolio tickers')
-    return parser.parse_args()
-def get_model_paths(ticker):
+    parser.add_argument('--interval', type=str, default='1d',
+                        help='Bar interval, e.g. 1d or intraday 1m/5m/15m/1h')
+    parser.add_argument('--period', type=str, default=None,
+                        help='History window (default: 1y, or the longest Yahoo allows for intraday)')
+    parser.add_argument('--provider', type=str, default=None, choices=sorted(market_data.PROVIDERS),
+                        help='Market data provider (default: $MARKET_DATA_PROVIDER or yahoo)')
+    parser.add_argument('--timings', action='store_true', help='Include per-stage timings in the JSON output')
+    parser.add_argument('--profile', type=str, default=None, help='Write cProfile stats for this run to the given path')
+    parser.add_argument('--timeline', action='store_true',
+                        help='Return the risk level and confidence of every bar in the period')
+    parser.add_argument('--train-only', action='store_true',
+                        help="Train or refresh the ticker's own model without running the analysis")
+    parser.add_argument('--worker', action='store_true',
+                        help='Serve JSON requests from stdin, one per line, until EOF')
+    args = parser.parse_args()
+    if not args.worker and not args.ticker:
+        parser.error('--ticker is required unless --worker is given')
+    return args
+def get_model_paths(ticker, interval='1d'):
     """Helper function to generate correct model paths"""
     # Create models directory if it doesn't exist
     os.makedirs(MODELS_DIR, exist_ok=True)
-    model_path = MODELS_DIR / f'{ticker}_risk_model.pkl'
-    scaler_path = MODELS_DIR / f'{ticker}_scaler.pkl'
+    # Daily models keep their original names; other intervals get their own files
+    prefix = ticker if interval == '1d' else f'{ticker}_{interval}'
+    model_path = MODELS_DIR / f'{prefix}_risk_model.pkl'
+    scaler_path = MODELS_DIR / f'{prefix}_scaler.pkl'
     return str(model_path), str(scaler_path)
 
+def get_metrics_path(model_path):
+    """Metrics JSON stored alongside a model file"""
+    return model_path.replace('_risk_model.pkl', '_model_metrics.json')
+
+def is_intraday(interval):
+    return interval in INTRADAY_MINUTES
+
+def default_period(interval):
+    """History window to request when the caller does not give one."""
+    if is_intraday(interval):
+        return INTRADAY_DEFAULT_PERIODS.get(interval, INTRADAY_FALLBACK_PERIOD)
+    return '1y'
+
+def feature_windows(interval='1d'):
+    """
+    Bar-aware window sizes and annualization factor for an interval.
+    Moving averages stay in bars (MA50/MA200 are chart conventions), while the
+    volatility window covers the same number of trading days on every interval,
+    capped at half the intraday history the provider serves so the default
+    period still leaves rows to analyze. min_bars is the shortest history that
+    yields any feature rows.
+    """
+    if is_intraday(interval):
+        bars_per_day = TRADING_MINUTES_PER_DAY / INTRADAY_MINUTES[interval]
+        bars_per_year = TRADING_DAYS_PER_YEAR * bars_per_day
+        history_days = INTRADAY_HISTORY_DAYS.get(interval, INTRADAY_FALLBACK_HISTORY_DAYS)
+        volatility_window = int(round(min(VOLATILITY_WINDOW_DAYS, history_days // 2) * bars_per_day))
+    else:
+        bars_per_year = BARS_PER_YEAR.get(interval, TRADING_DAYS_PER_YEAR)
+        volatility_window = VOLATILITY_WINDOW_DAYS
+    return {
+        'volatility': volatility_window,
+        'annualization': np.sqrt(bars_per_year),
+        'warmup': max(volatility_window, 200) + CHUNK_EMA_WARMUP,
+        'min_bars': max(volatility_window, 200) + 1
+    }
+
+# Shorter windows accepted for newly listed stocks, longest first
+FALLBACK_PERIODS = ['6mo', '3mo', '1mo']
+
 @lru_cache(maxsize=32)
-def get_stock_data(ticker, period='1y', interval='1d'):
+def get_stock_data(ticker, period='1y', interval='1d', provider=None):
     """
-    Fetch historical stock data for a given ticker using Yahoo Finance API.
-    Dynamically adjusts the period for newly listed stocks if data is unavailable.
+    Fetch historical stock data for a given ticker from the configured market
+    data provider (Yahoo Finance by default, or the local CSV / replay backends).
+    Newly listed stocks with less history than requested are served from the
+    same single fetch instead of re-requesting shorter periods.
 
     Uses LRU cache to improve performance for repeated requests.
     """
     try:
-        stock = yf.Ticker(ticker)
-        hist = stock.history(period=period, interval=interval)
-
-        # If data is not available for the specified period, try shorter periods
-        if hist.empty:
-            for fallback_period in ['6mo', '3mo', '1mo']:
-                hist = stock.history(period=fallback_period, interval=interval)
-                if not hist.empty:
-                    logging.info(f"Data found for {ticker} with period '{fallback_period}'.")
-                    break
+        hist = market_data.get_provider(provider).history(ticker, period=period, interval=interval)
 
         if hist.empty:
             raise ValueError(f"No data found for ticker: {ticker}")
 
+        # Report when only a shorter fallback window is available
+        if period in market_data.PERIOD_OFFSETS and market_data.covered_period(hist, [period]) is None:
+            fallback_period = market_data.covered_period(hist, FALLBACK_PERIODS)
+            logging.info(f"Data found for {ticker} with period '{fallback_period or len(hist)}'.")
+
         return hist
 
     except Exception as e:
@@ -85,67 +211,48 @@ def preprocess_data(df):
         if len(df) < 10:  # Ensure enough data points exist
             raise ValueError("Insufficient data available for meaningful analysis.")
 
-        # Make a copy to avoid SettingWithCopyWarning
-        df = df.copy()
-        
+        # Reset index to have Date as a column; this returns a new frame, so
+        # the caller's (possibly cached) data is left untouched
+        df = df.reset_index()
+        if 'Datetime' in df.columns:
+            # Yahoo names the index Datetime for intraday bars
+            df.rename(columns={'Datetime': 'Date'}, inplace=True)
+
         # Handle missing values
         df.dropna(inplace=True)
         
-        # Reset index to have Date as a column
-        df.reset_index(inplace=True)
-        
         return df
     except Exception as e:
         logging.error(f"Error during preprocessing: {str(e)}")
         raise ValueError(f"Error during preprocessing: {e}")
 
-def add_features(df):
+def add_features(df, interval='1d', chunk_size=FEATURE_CHUNK_SIZE, copy=True):
     """
     Add technical indicators as features for the model. Handles missing data appropriately.
     Enhanced with additional technical indicators for better prediction capability.
+
+    Window sizes and annualization follow the bar interval. Series longer than
+    chunk_size are processed in chunks (with warm-up overlap and a carried OBV
+    total) so peak memory stays bounded; intraday features are stored as float32.
+    Pass copy=False when the caller owns df and it may be modified in place.
     """
     try:
-        # Make a copy to avoid SettingWithCopyWarning
-        df = df.copy()
-        
-        # Basic features
-        df['Daily Return'] = df['Close'].pct_change()
-        df['Volatility'] = df['Daily Return'].rolling(window=21).std() * np.sqrt(252)
-        df['MA50'] = df['Close'].rolling(window=50).mean()
-        df['MA200'] = df['Close'].rolling(window=200).mean()
-
-        # Additional technical indicators using pandas_ta
-        df['RSI'] = df.ta.rsi(length=14)
-        macd = df.ta.macd(fast=12, slow=26, signal=9)
-        df['MACD'] = macd['MACD_12_26_9']
-        df['MACD_Signal'] = macd['MACDs_12_26_9']
-        df['MACD_Hist'] = macd['MACDh_12_26_9']
-
-        # Bollinger Bands
-        bb_bands = df.ta.bbands(close=df['Close'], length=20)
-        df['BB_upper'] = bb_bands['BBU_20_2.0']
-        df['BB_middle'] = bb_bands['BBM_20_2.0']
-        df['BB_lower'] = bb_bands['BBL_20_2.0']
-        
-        # Price-to-Moving Average Ratios
-        df['Price_to_MA50'] = df['Close'] / df['MA50']
-        df['Price_to_MA200'] = df['Close'] / df['MA200']
-        
-        # Rate of change indicators
-        df['ROC_5'] = df['Close'].pct_change(periods=5)
-        df['ROC_10'] = df['Close'].pct_change(periods=10)
-        
-        # Average True Range for volatility
-        df['ATR'] = df.ta.atr(length=14)
-        
-        # Volume-based indicators
-        df['Volume_ROC'] = df['Volume'].pct_change()
-        df['OBV'] = df.ta.obv()
-        
-        # Stochastic Oscillator
-        stoch = df.ta.stoch(high=df['High'], low=df['Low'], close=df['Close'])
-        df['Stoch_K'] = stoch['STOCHk_14_3_3']
-        df['Stoch_D'] = stoch['STOCHd_14_3_3']
+        windows = feature_windows(interval)
+        dtype = np.float32 if is_intraday(interval) else np.float64
+        if len(df) < windows['min_bars']:
+            raise ValueError(f"Period too short for interval '{interval}': {len(df)} bars, "
+                             f"the indicators need at least {windows['min_bars']}")
+
+        if copy:
+            # Make a copy to avoid SettingWithCopyWarning
+            df = df.copy()
+
+        if len(df) <= chunk_size:
+            _compute_features(df, windows)
+            if dtype is np.float32:
+                df[FEATURE_COLUMNS] = df[FEATURE_COLUMNS].astype(np.float32)
+        else:
+            _compute_features_chunked(df, windows, chunk_size, dtype)
 
         # Handle missing values after feature addition
         df.dropna(inplace=True)
@@ -155,16 +262,91 @@ def add_features(df):
         logging.error(f"Error adding features: {str(e)}")
         raise ValueError(f"Error adding features: {e}")
 
-def label_risk(df):
+def _compute_features(df, windows):
+    """
+    Compute every feature column on df in place.
+    """
+    # Basic features
+    df['Daily Return'] = df['Close'].pct_change()
+    df['Volatility'] = df['Daily Return'].rolling(window=windows['volatility']).std() * windows['annualization']
+    df['MA50'] = df['Close'].rolling(window=50).mean()
+    df['MA200'] = df['Close'].rolling(window=200).mean()
+
+    # Additional technical indicators using pandas_ta
+    df['RSI'] = df.ta.rsi(length=14)
+    macd = df.ta.macd(fast=12, slow=26, signal=9)
+    df['MACD'] = macd['MACD_12_26_9']
+    df['MACD_Signal'] = macd['MACDs_12_26_9']
+    df['MACD_Hist'] = macd['MACDh_12_26_9']
+
+    # Bollinger Bands
+    bb_bands = df.ta.bbands(close=df['Close'], length=20)
+    df['BB_upper'] = bb_bands['BBU_20_2.0']
+    df['BB_middle'] = bb_bands['BBM_20_2.0']
+    df['BB_lower'] = bb_bands['BBL_20_2.0']
+
+    # Price-to-Moving Average Ratios
+    df['Price_to_MA50'] = df['Close'] / df['MA50']
+    df['Price_to_MA200'] = df['Close'] / df['MA200']
+
+    # Rate of change indicators
+    df['ROC_5'] = df['Close'].pct_change(periods=5)
+    df['ROC_10'] = df['Close'].pct_change(periods=10)
+
+    # Average True Range for volatility
+    df['ATR'] = df.ta.atr(length=14)
+
+    # Volume-based indicators
+    df['Volume_ROC'] = df['Volume'].pct_change()
+    df['OBV'] = df.ta.obv()
+
+    # Stochastic Oscillator
+    stoch = df.ta.stoch(high=df['High'], low=df['Low'], close=df['Close'])
+    df['Stoch_K'] = stoch['STOCHk_14_3_3']
+    df['Stoch_D'] = stoch['STOCHd_14_3_3']
+
+def _compute_features_chunked(df, windows, chunk_size, dtype):
+    """
+    Compute features chunk by chunk into preallocated arrays. Each chunk is
+    preceded by enough history for the rolling windows and EMAs to match a
+    single pass, and OBV (a running total) is carried over between chunks.
+    """
+    n = len(df)
+    warmup = windows['warmup']
+    ohlcv = df[['Open', 'High', 'Low', 'Close', 'Volume']]
+    columns = {name: np.empty(n, dtype=dtype) for name in FEATURE_COLUMNS}
+    obv_total = None
+
+    for start in range(0, n, chunk_size):
+        end = min(start + chunk_size, n)
+        lo = max(0, start - warmup)
+        chunk = ohlcv.iloc[lo:end].copy()
+        _compute_features(chunk, windows)
+
+        for name in FEATURE_COLUMNS:
+            values = chunk[name].to_numpy(dtype=np.float64)[start - lo:]
+            if name == 'OBV':
+                if obv_total is not None:
+                    # Re-base this chunk's OBV on the running total so far
+                    values = values + (obv_total - chunk[name].iloc[start - lo - 1])
+                obv_total = values[-1]
+            columns[name][start:end] = values
+
+    for name, values in columns.items():
+        df[name] = values
+
+def label_risk(df, copy=True):
     """
     Label the risk level based on volatility quantiles.
+    Pass copy=False when the caller owns df and it may be modified in place.
     """
     try:
-        # Make a copy to avoid SettingWithCopyWarning
-        df = df.copy()
+        if copy:
+            # Make a copy to avoid SettingWithCopyWarning
+            df = df.copy()
         
         # Ensure no missing values in Volatility
-        df = df.dropna(subset=['Volatility'])
+        df.dropna(subset=['Volatility'], inplace=True)
         
         # Create risk levels based on volatility quantiles
         quantiles = df['Volatility'].quantile([0.33, 0.66])
@@ -174,47 +356,59 @@ def label_risk(df):
             (df['Volatility'] <= quantiles[0.33])
         ]
         choices = ['High', 'Medium', 'Low']
-        df['Risk Level'] = np.select(conditions, choices)
+        df['Risk Level'] = np.select(conditions, choices, default='Low')
         
         return df
     except Exception as e:
         logging.error(f"Error during risk labeling: {str(e)}")
         raise ValueError(f"Error during labeling: {e}")
 
-def should_retrain_model(model_path):
+def build_feature_frame(raw, interval='1d'):
     """
-    Check if model should be retrained based on creation date.
-    Returns True if model doesn't exist or is older than 7 days.
+    Preprocess, add features to and label a provider history frame, keeping
+    only the columns training and inference use.
     """
-    if not os.path.exists(model_path):
-        return True
-    
-    # Retrain if model is older than 7 days
-    model_age = time.time() - os.path.getmtime(model_path)
-    return model_age > (7 * 24 * 60 * 60)  # 7 days in seconds
+    with stage_timer.stage('preprocess_data'):
+        data = preprocess_data(raw)
+    with stage_timer.stage('add_features'):
+        data = add_features(data, interval, copy=False)
+    with stage_timer.stage('label_risk'):
+        data = label_risk(data, copy=False)
+    return data[[c for c in FEATURE_FRAME_COLUMNS if c in data.columns]].reset_index(drop=True)
+
+FEATURE_STORE = feature_store.FeatureStore(build_feature_frame, FEATURE_SET_VERSION)
+
+def get_features(ticker, period='1y', interval='1d', provider=None):
+    """
+    Labeled feature frame for a ticker, computed once per version of its data
+    and shared by training, incremental updates and inference.
+    The returned frame is shared and must not be modified.
+    """
+    with stage_timer.stage('get_stock_data'):
+        raw = get_stock_data(ticker, period, interval, provider)
+    with stage_timer.stage('features'):
+        return FEATURE_STORE.get(ticker, interval, raw, period)
 
-def train_and_save_model(ticker, model_path, scaler_path):
+def save_joblib(obj, path):
+    """
+    Atomically replace a joblib file, so concurrent readers never load a torn model.
+    """
+    with atomic_write(path, 'wb') as f:
+        joblib.dump(obj, f)
+
+def train_and_save_model(ticker, model_path, scaler_path, period='1y', interval='1d', decision=None):
     """
     Train a machine learning model for a specific ticker and save the model along with its scaler.
-    Enhanced with cross-validation and model metrics storage.
+    Enhanced with cross-validation and model metrics storage. The training-data
+    profile used by the retrain policy, and the decision that led here, are
+    saved with the metrics.
     """
     try:
-        # Fetch, preprocess, and add features to the stock data
-        data = get_stock_data(ticker)
-        data = preprocess_data(data)
-        data = add_features(data)
-        data = label_risk(data)
+        # Labeled features, shared with inference through the feature store
+        data = get_features(ticker, period, interval)
 
         # Select features and target - using expanded feature set
-        features = [
-            'Daily Return', 'Volatility', 'MA50', 'MA200',
-            'RSI', 'MACD', 'MACD_Signal', 'MACD_Hist',
-            'BB_upper', 'BB_middle', 'BB_lower',
-            'Price_to_MA50', 'Price_to_MA200', 
-            'ROC_5', 'ROC_10', 'ATR', 
-            'Volume_ROC', 'OBV',
-            'Stoch_K', 'Stoch_D'
-        ]
+        features = FEATURE_COLUMNS
         
         # Only use features that exist in the dataframe
         available_features = [f for f in features if f in data.columns]
@@ -241,7 +435,8 @@ def train_and_save_model(ticker, model_path, scaler_path):
                                  cv=5,
                                  scoring='accuracy',
                                  n_jobs=-1)
-        grid_search.fit(X_train_scaled, y_train)
+        with stage_timer.stage('grid_search'):
+            grid_search.fit(X_train_scaled, y_train)
 
         # Get the best model
         best_model = grid_search.best_estimator_
@@ -249,7 +444,8 @@ def train_and_save_model(ticker, model_path, scaler_path):
         # Evaluate the model with stratified k-fold
         skf = StratifiedKFold(n_splits=5, shuffle=True, random_state=42)
         X_scaled = scaler.transform(X)
-        cv_scores = cross_val_score(best_model, X_scaled, y, cv=skf, scoring='accuracy')
+        with stage_timer.stage('cross_validation'):
+            cv_scores = cross_val_score(best_model, X_scaled, y, cv=skf, scoring='accuracy')
         
         # Evaluate on test set
         y_pred = best_model.predict(X_test_scaled)
@@ -261,17 +457,23 @@ def train_and_save_model(ticker, model_path, scaler_path):
             'best_params': grid_search.best_params_,
             'feature_importance': {feature: float(importance) for feature, importance in 
                                   zip(available_features, best_model.feature_importances_)},
-            'features_used': available_features
+            'features_used': available_features,
+            'interval': interval,
+            'period': period,
+            'data_end': str(data['Date'].iloc[-1]),
+            'last_full_retrain': time.time(),
+            'incremental_updates': 0,
+            'policy_decision': decision,
+            **retrain_policy.training_profile(data, available_features)
         }
         
-        # Save evaluation metrics
-        metrics_path = str(MODELS_DIR / f'{ticker}_model_metrics.json')
-        with open(metrics_path, 'w') as f:
-            json.dump(evaluation_results, f)
-
-        # Save the best model and scaler
-        joblib.dump(best_model, model_path)
-        joblib.dump(scaler, scaler_path)
+        with stage_timer.stage('save'):
+            # Save the best model and scaler, then the metrics: each file is
+            # replaced atomically, and the metrics (with the data fingerprint)
+            # go last so an interrupted save is retrained rather than trusted
+            save_joblib(best_model, model_path)
+            save_joblib(scaler, scaler_path)
+            atomic_write_json(get_metrics_path(model_path), evaluation_results)
         
         logging.info(f"Model for {ticker} trained and saved with accuracy: {cv_scores.mean():.4f}")
         return best_model, scaler, available_features
@@ -281,6 +483,87 @@ def train_and_save_model(ticker, model_path, scaler_path):
         logging.error(traceback.format_exc())
         raise ValueError(f"Error training and saving model for {ticker}: {e}")
 
+def update_model_incrementally(ticker, model_path, scaler_path, period='1y', interval='1d', decision=None):
+    """
+    Warm-start update of an existing forest with the bars that arrived since it
+    was last trained: INCREMENTAL_NEW_TREES trees are grown on the recent window
+    and the same number of oldest trees are dropped, keeping the scaler fixed.
+    The update is kept only if holdout accuracy on recent bars does not drop by
+    more than UPDATE_ACCURACY_TOLERANCE.
+
+    Returns (model, scaler, features_used), or None when a full retrain is due
+    (no training watermark, too many updates, too old, or unusable recent data).
+    """
+    try:
+        model, scaler, features_used = load_model_and_scaler(model_path, scaler_path)
+        metrics_path = get_metrics_path(model_path)
+        with open(metrics_path, 'r') as f:
+            metrics = json.load(f)
+
+        if 'data_end' not in metrics or not hasattr(model, 'estimators_'):
+            return None
+        if metrics.get('incremental_updates', 0) >= MAX_INCREMENTAL_UPDATES:
+            logging.info(f"{ticker}: {MAX_INCREMENTAL_UPDATES} incremental updates reached, doing a full retrain")
+            return None
+        if time.time() - metrics.get('last_full_retrain', 0) > retrain_policy.MAX_MODEL_AGE_DAYS * 24 * 60 * 60:
+            logging.info(f"{ticker}: last full retrain older than {retrain_policy.MAX_MODEL_AGE_DAYS} days, "
+                         f"doing a full retrain")
+            return None
+
+        data = get_features(ticker, period, interval)
+
+        new_bars = int((data['Date'] > pd.Timestamp(metrics['data_end'])).sum())
+        if new_bars == 0:
+            return model, scaler, features_used
+
+        recent = data.iloc[-max(INCREMENTAL_WINDOW_BARS, new_bars):]
+        X = scaler.transform(recent[features_used].values)
+        y = recent['Risk Level'].values.ravel()
+
+        # New trees must see every class the forest already predicts
+        classes, counts = np.unique(y, return_counts=True)
+        if list(classes) != list(model.classes_) or counts.min() < 2:
+            logging.info(f"{ticker}: recent window does not cover every risk level, doing a full retrain")
+            return None
+
+        X_train, X_holdout, y_train, y_holdout = train_test_split(X, y, test_size=0.25, random_state=42, stratify=y)
+        old_accuracy = float((model.predict(X_holdout) == y_holdout).mean())
+
+        with stage_timer.stage('warm_start_fit'):
+            model.set_params(warm_start=True, n_estimators=len(model.estimators_) + INCREMENTAL_NEW_TREES)
+            model.fit(X_train, y_train)
+            # Retire the oldest trees so the forest keeps its size
+            model.estimators_ = model.estimators_[INCREMENTAL_NEW_TREES:]
+            model.set_params(warm_start=False, n_estimators=len(model.estimators_))
+
+        new_accuracy = float((model.predict(X_holdout) == y_holdout).mean())
+        if new_accuracy < old_accuracy - UPDATE_ACCURACY_TOLERANCE:
+            logging.warning(f"{ticker}: incremental update rejected (holdout accuracy "
+                            f"{old_accuracy:.4f} -> {new_accuracy:.4f}), doing a full retrain")
+            return None
+
+        metrics.update({
+            'data_end': str(data['Date'].iloc[-1]),
+            'incremental_updates': metrics.get('incremental_updates', 0) + 1,
+            'last_incremental_update': time.time(),
+            'incremental_holdout_accuracy': new_accuracy,
+            'feature_importance': {feature: float(importance) for feature, importance in
+                                   zip(features_used, model.feature_importances_)},
+            'policy_decision': decision,
+            **retrain_policy.training_profile(data, features_used)
+        })
+        with stage_timer.stage('save'):
+            save_joblib(model, model_path)
+            atomic_write_json(metrics_path, metrics)
+
+        logging.info(f"Model for {ticker} updated with {new_bars} new bars "
+                     f"(holdout accuracy {old_accuracy:.4f} -> {new_accuracy:.4f})")
+        return model, scaler, features_used
+
+    except Exception as e:
+        logging.error(f"Incremental update failed for {ticker}, falling back to full retrain: {str(e)}")
+        return None
+
 def load_model_and_scaler(model_path, scaler_path):
     """
     Load a trained model and its corresponding scaler from disk.
@@ -290,8 +573,7 @@ def load_model_and_scaler(model_path, scaler_path):
         scaler = joblib.load(scaler_path)
         
         # Load features used during training
-        ticker = os.path.basename(model_path).split('_')[0]
-        metrics_path = str(MODELS_DIR / f'{ticker}_model_metrics.json')
+        metrics_path = get_metrics_path(model_path)
         
         with open(metrics_path, 'r') as f:
             metrics = json.load(f)
@@ -302,56 +584,177 @@ def load_model_and_scaler(model_path, scaler_path):
         logging.error(f"Failed to load model or scaler: {str(e)}")
         raise ValueError(f"Failed to load model or scaler: {e}")
 
-def risk_analysis_model(new_stock_ticker):
+def _load_model_and_decide(ticker, period, interval, model_path, scaler_path):
+    """
+    The saved model, scaler and features (Nones if there is no model yet), the
+    retrain policy's decision for them given the current data, and the period
+    the model is trained on. Models are keyed by ticker and interval only, so a
+    saved model is judged on the period it was trained on rather than the one
+    requested; a missing model is trained on the requested period.
+    """
+    if not os.path.exists(model_path) or not os.path.exists(scaler_path):
+        return (None, None, None), {'action': retrain_policy.RETRAIN, 'reasons': ['no saved model'],
+                                    'statistics': {}}, period
+
+    with stage_timer.stage('load_model'):
+        try:
+            with open(get_metrics_path(model_path), 'r') as f:
+                metrics = json.load(f)
+        except (OSError, ValueError) as e:
+            # Metrics are saved last, so a model without them is from an interrupted save
+            logging.warning(f"Retraining {ticker}: model metrics missing or unreadable ({e})")
+            return (None, None, None), {'action': retrain_policy.RETRAIN,
+                                        'reasons': ['model metrics missing or unreadable'],
+                                        'statistics': {}}, period
+        loaded = load_model_and_scaler(model_path, scaler_path)
+    # Models saved before the period was recorded were trained on the default one
+    training_period = metrics.get('period', default_period(interval))
+    with stage_timer.stage('retrain_policy'):
+        decision = retrain_policy.decide(metrics, get_features(ticker, training_period, interval), *loaded)
+    logging.info(f"Retrain policy for {ticker}: {decision['action']} ({'; '.join(decision['reasons'])})")
+    return loaded, decision, training_period
+
+def get_model(ticker, period='1y', interval='1d'):
+    """
+    Load the ticker's model, training it if missing. A saved model is kept,
+    updated incrementally or retrained as the retrain policy decides from the
+    current data. A saved model is updated and retrained on the period it was
+    trained on; `period` only applies to a ticker's first model.
+    Returns (model, scaler, features_used, decision).
+    """
+    model_path, scaler_path = get_model_paths(ticker, interval)
+    (model, scaler, features_used), decision, training_period = _load_model_and_decide(
+        ticker, period, interval, model_path, scaler_path)
+
+    if decision['action'] != retrain_policy.KEEP:
+        # Only one process trains or updates a ticker's model at a time. The
+        # others wait here and decide again, by which time the model they
+        # would have built has usually been saved and is simply kept.
+        with stage_timer.stage('model_lock'), single_flight(f'model:{ticker}:{interval}'):
+            (model, scaler, features_used), decision, training_period = _load_model_and_decide(
+                ticker, period, interval, model_path, scaler_path)
+
+            if decision['action'] == retrain_policy.UPDATE:
+                # Fold in the new bars cheaply; fall back to a full retrain when that is not possible
+                with stage_timer.stage('update_model_incrementally'):
+                    updated = update_model_incrementally(ticker, model_path, scaler_path, training_period,
+                                                         interval, decision)
+                if updated is None:
+                    decision = {**decision, 'action': retrain_policy.RETRAIN,
+                                'reasons': decision['reasons'] + ['incremental update not possible']}
+                else:
+                    model, scaler, features_used = updated
+
+            if decision['action'] == retrain_policy.RETRAIN:
+                with stage_timer.stage('train_and_save_model'):
+                    model, scaler, features_used = train_and_save_model(ticker, model_path, scaler_path,
+                                                                        training_period, interval, decision)
+
+    # If features_used is None, use a default set
+    if features_used is None:
+        features_used = ['Daily Return', 'Volatility', 'MA50', 'MA200']
+    return model, scaler, features_used, decision
+
+def training_marker_path(ticker, interval):
+    return TRAINING_MARKER_DIR / f'{ticker}_{interval}.training'
+
+def start_background_training(ticker, period, interval):
+    """
+    Train a ticker's own model in a detached `--train-only` process unless any
+    process has already started one: the marker file is created exclusively
+    by the first caller and removed by the trainer when it finishes.
+    Returns whether a process was started.
+    """
+    if not BACKGROUND_TRAINING:
+        return False
+    marker = training_marker_path(ticker, interval)
+    os.makedirs(TRAINING_MARKER_DIR, exist_ok=True)
+    try:
+        if time.time() - os.path.getmtime(marker) > TRAINING_MARKER_SECONDS:
+            os.remove(marker)
+    except OSError:
+        pass
+    try:
+        os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return False
+
+    try:
+        subprocess.Popen(
+            [sys.executable, str(pathlib.Path(__file__).resolve()), '--ticker', ticker, '--period', period,
+             '--interval', interval, '--provider', market_data.DEFAULT_PROVIDER, '--train-only'],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+    except OSError as e:
+        logging.error(f"Failed to start background training for {ticker}: {e}")
+        os.remove(marker)
+        return False
+    return True
+
+def risk_analysis_model(new_stock_ticker, period=None, interval='1d'):
     """
     Perform risk analysis on a given stock ticker.
     Returns a comprehensive dictionary of risk metrics and insights.
+    Intraday intervals (e.g. '5m') use bar-aware windows and their own models.
     """
     try:
-        data = get_stock_data(new_stock_ticker)
+        period = period or default_period(interval)
+        with stage_timer.stage('get_stock_data'):
+            data = get_stock_data(new_stock_ticker, period, interval)
 
         # Check if the data is too short for analysis
         if len(data) < 10:
             logging.warning(f"Skipping {new_stock_ticker} due to insufficient data.")
             return {'error': "Insufficient data for analysis."}
 
-        # Proceed with analysis if enough data
-        data = preprocess_data(data)
-        data = add_features(data)
-        data = label_risk(data)
+        # Proceed with analysis if enough data; features are computed once
+        # here and reused if the model is trained or updated below
+        data = get_features(new_stock_ticker, period, interval)
 
-        # Paths for the model and scaler
-        model_path, scaler_path = get_model_paths(new_stock_ticker)
-
-        # Load or train the model
-        if should_retrain_model(model_path) or not os.path.exists(model_path) or not os.path.exists(scaler_path):
-            model, scaler, features_used = train_and_save_model(new_stock_ticker, model_path, scaler_path)
+        model_path, _ = get_model_paths(new_stock_ticker, interval)
+        if (UNIVERSE_COLD_START and not os.path.exists(model_path)
+                and pooled_model.is_available(interval, MODELS_DIR)):
+            # Answer a cold ticker right away from the universe model; its own
+            # model is trained in the background and serves later requests
+            with stage_timer.stage('load_model'):
+                model, scaler, features_used = pooled_model.load_universe_model(MODELS_DIR)
+            model_inputs = pooled_model.scale_free_features(data)
+            model_source = 'universe'
+            if start_background_training(new_stock_ticker, period, interval):
+                training = 'per-ticker training started in the background'
+            elif BACKGROUND_TRAINING:
+                training = 'per-ticker training already requested'
+            else:
+                training = 'background training disabled (run with --train-only)'
+            decision = {'action': 'deferred', 'statistics': {},
+                        'reasons': ['no saved model, served by the universe model', training]}
         else:
-            model, scaler, features_used = load_model_and_scaler(model_path, scaler_path)
-
-        # If features_used is None, use a default set
-        if features_used is None:
-            features_used = ['Daily Return', 'Volatility', 'MA50', 'MA200']
+            # Load, update or train the model
+            model, scaler, features_used, decision = get_model(new_stock_ticker, period, interval)
+            model_inputs = data
+            model_source = 'ticker'
 
         # Ensure all required features are in the dataframe
-        missing_features = [f for f in features_used if f not in data.columns]
+        missing_features = [f for f in features_used if f not in model_inputs.columns]
         if missing_features:
             logging.warning(f"Missing features for {new_stock_ticker}: {missing_features}")
             # Use only available features
-            features_used = [f for f in features_used if f in data.columns]
+            features_used = [f for f in features_used if f in model_inputs.columns]
 
-        # Get features for prediction
-        latest_data = data[features_used].iloc[-1]
+        with stage_timer.stage('predict'):
+            # Get features for prediction
+            latest_data = model_inputs[features_used].iloc[-1]
 
-        # Scale the latest data
-        latest_data_scaled = scaler.transform(latest_data.values.reshape(1, -1))
+            # Scale the latest data
+            latest_data_scaled = scaler.transform(latest_data.values.reshape(1, -1))
 
-        # Make prediction
-        risk_level = model.predict(latest_data_scaled)[0]
-        
-        # Get prediction probabilities
-        risk_probs = model.predict_proba(latest_data_scaled)[0]
-        confidence_score = risk_probs[list(model.classes_).index(risk_level)]
+            # Make prediction
+            risk_level = model.predict(latest_data_scaled)[0]
+
+            # Get prediction probabilities
+            risk_probs = model.predict_proba(latest_data_scaled)[0]
+            confidence_score = risk_probs[list(model.classes_).index(risk_level)]
 
         # Calculate additional insights
         rsi_value = data['RSI'].iloc[-1] if 'RSI' in data.columns else None
@@ -429,6 +832,7 @@ def risk_analysis_model(new_stock_ticker):
         # Prepare comprehensive results
         results = {
             'risk_level': risk_level,
+            'interval': interval,
             'current_price': f"{data['Close'].iloc[-1]:.2f}",
             'volatility': f"{data['Volatility'].iloc[-1] * 100:.2f}%",
             'daily_return': f"{data['Daily Return'].iloc[-1] * 100:.2f}%",
@@ -441,6 +845,8 @@ def risk_analysis_model(new_stock_ticker):
             'confidence_score': f"{confidence_score:.2f}",
             'bollinger_band_position': bb_position,
             'stochastic_signal': stoch_signal,
+            'model_source': model_source,
+            'retrain_policy': decision,
             'recommendations': generate_recommendations(data, risk_level, rsi_value, macd_signal, price_position)
         }
 
@@ -451,6 +857,83 @@ def risk_analysis_model(new_stock_ticker):
         logging.error(traceback.format_exc())
         return {'error': str(e)}
 
+def risk_timeline(ticker, period=None, interval='1d', use_cache=True):
+    """
+    Risk level and confidence for every bar in the window, scaled and
+    classified in one batch. The timeline is cached per model version and
+    extended with only the bars that arrived since, so earlier entries keep
+    the classification made when they were the latest bar. Each period has
+    its own cache; a new model or feature set, rewritten history, or a window
+    reaching back before the cached one rescores the whole window.
+    """
+    try:
+        period = period or default_period(interval)
+        data = get_features(ticker, period, interval)
+        model, scaler, features_used, _ = get_model(ticker, period, interval)
+        model_path, _ = get_model_paths(ticker, interval)
+        model_version = market_data.file_fingerprint(model_path)
+
+        dates = data['Date'].astype(str).tolist()
+        positions = {date: i for i, date in enumerate(dates)}
+        cache_path = TIMELINE_CACHE_DIR / f'{ticker}_{interval}_{period}_timeline.json'
+
+        cached = None
+        if use_cache and cache_path.exists():
+            with open(cache_path) as f:
+                cached = json.load(f)
+            if (cached.get('model_version') != model_version
+                    or cached.get('feature_set_version') != FEATURE_SET_VERSION
+                    or not cached['dates'] or cached['dates'][-1] not in positions
+                    or dates[0] < cached['dates'][0]):
+                cached = None
+
+        timeline = {'dates': [], 'risk_level': [], 'confidence': []}
+        start = 0
+        if cached is not None:
+            # Keep cached entries still inside the window, score only newer bars
+            keep = [i for i, date in enumerate(cached['dates']) if date in positions]
+            for name in timeline:
+                timeline[name] = [cached[name][i] for i in keep]
+            start = positions[cached['dates'][-1]] + 1
+
+        new_rows = data.iloc[start:]
+        if len(new_rows):
+            with stage_timer.stage('timeline_predict'):
+                probabilities = model.predict_proba(scaler.transform(new_rows[features_used].values))
+            timeline['dates'] += dates[start:]
+            timeline['risk_level'] += model.classes_[probabilities.argmax(axis=1)].tolist()
+            timeline['confidence'] += probabilities.max(axis=1).round(4).tolist()
+
+            atomic_write_json(cache_path, {
+                'model_version': model_version,
+                'feature_set_version': FEATURE_SET_VERSION,
+                **timeline
+            })
+
+        # Consecutive bars with the same risk level, collapsed into regimes
+        regimes = []
+        for date, level in zip(timeline['dates'], timeline['risk_level']):
+            if regimes and regimes[-1]['risk_level'] == level:
+                regimes[-1]['end'] = date
+                regimes[-1]['bars'] += 1
+            else:
+                regimes.append({'risk_level': level, 'start': date, 'end': date, 'bars': 1})
+
+        return {
+            'ticker': ticker,
+            'interval': interval,
+            'model_version': model_version,
+            'model_source': 'ticker',
+            'bars_scored': len(new_rows),
+            **timeline,
+            'regimes': regimes
+        }
+
+    except Exception as e:
+        logging.error(f"Error building risk timeline for {ticker}: {str(e)}")
+        logging.error(traceback.format_exc())
+        return {'error': str(e)}
+
 def generate_recommendations(data, risk_level, rsi_value, macd_signal, price_position):
     """
     Generate trading recommendations based on technical indicators.
@@ -492,7 +975,7 @@ def generate_recommendations(data, risk_level, rsi_value, macd_signal, price_pos
     
     return recommendations
 
-def fetch_risk_results(new_stock_ticker, portfolio):
+def fetch_risk_results(new_stock_ticker, portfolio, period=None, interval='1d'):
     """
     Main function to get risk analysis results for a stock.
     Updates portfolio and handles all exceptions gracefully.
@@ -500,14 +983,8 @@ def fetch_risk_results(new_stock_ticker, portfolio):
     logging.info(f"Performing risk analysis for {new_stock_ticker}")
     
     try:
-        # Get paths for model and scaler
-        model_path, scaler_path = get_model_paths(new_stock_ticker)
-
-        # Check if we need to retrain
-        need_retrain = should_retrain_model(model_path) or new_stock_ticker not in portfolio
-        
-        # Run the risk analysis
-        results = risk_analysis_model(new_stock_ticker)
+        # Run the risk analysis (the retrain policy decides whether the model is refreshed)
+        results = risk_analysis_model(new_stock_ticker, period, interval)
         
         # Add to portfolio if not already present
         if new_stock_ticker not in portfolio:
@@ -515,6 +992,10 @@ def fetch_risk_results(new_stock_ticker, portfolio):
         
         # Add a timestamp to the results
         results['analysis_timestamp'] = time.strftime('%Y-%m-%d %H:%M:%S')
+
+        # Attach per-stage timings when instrumentation is on
+        if stage_timer.ENABLED:
+            results['timings'] = stage_timer.get_timings()
         
         return results
     except Exception as e:
@@ -525,20 +1006,83 @@ def fetch_risk_results(new_stock_ticker, portfolio):
             'ticker': new_stock_ticker,
             'analysis_timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
         }
+def run_worker(portfolio):
+    """
+    Serve risk analysis requests read from stdin, one JSON object per line
+    (e.g. {"ticker": "TCS.NS", "interval": "5m"}, or with "timeline": true for the
+    per-bar risk timeline), writing one JSON result per line to stdout.
+    Keeps models and fetched data warm across requests. On EOF, prints the
+    stage timing histograms aggregated over every request.
+    """
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+            ticker = request['ticker']
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            print(json.dumps({'error': f"Invalid request: {e}"}), flush=True)
+            continue
+
+        stage_timer.reset()
+        if request.get('timeline'):
+            results = risk_timeline(ticker, request.get('period'), request.get('interval', '1d'))
+        else:
+            results = fetch_risk_results(ticker, request.get('portfolio', portfolio),
+                                         request.get('period'), request.get('interval', '1d'))
+        print(json.dumps(results), flush=True)
+
+    if stage_timer.ENABLED:
+        print(json.dumps({'timing_histograms': stage_timer.get_histograms()}), flush=True)
+
 if __name__ == "__main__":
     try:
         # Parse command line arguments
         args = parse_args()
         ticker = args.ticker
+
+        if args.timings:
+            stage_timer.enable()
+        if args.provider:
+            market_data.set_default_provider(args.provider)
         
         # Parse portfolio JSON
         try:
             portfolio = json.loads(args.portfolio)
         except json.JSONDecodeError:
             portfolio = []
+
+        if args.worker:
+            run_worker(portfolio)
+            sys.exit(0)
+
+        if args.train_only:
+            try:
+                _, _, _, decision = get_model(ticker, args.period or default_period(args.interval), args.interval)
+            finally:
+                # A failed run lets the next cold request start training again
+                try:
+                    os.remove(training_marker_path(ticker, args.interval))
+                except FileNotFoundError:
+                    pass
+            print(json.dumps({'ticker': ticker, 'interval': args.interval, 'retrain_policy': decision}))
+            sys.exit(0)
         
-        # Run risk analysis
-        results = fetch_risk_results(ticker, portfolio)
+        # Run risk analysis (or the per-bar timeline), optionally under the profiler
+        if args.timeline:
+            analysis, analysis_args = risk_timeline, (ticker, args.period, args.interval)
+        else:
+            analysis, analysis_args = fetch_risk_results, (ticker, portfolio, args.period, args.interval)
+        if args.profile:
+            profiler = cProfile.Profile()
+            results = profiler.runcall(analysis, *analysis_args)
+            profiler.dump_stats(args.profile)
+            logging.info(f"Profile written to {args.profile}")
+        else:
+            results = analysis(*analysis_args)
+        if args.timeline and stage_timer.ENABLED:
+            results['timings'] = stage_timer.get_timings()
         
         # Print results as JSON to stdout
         print(json.dumps(results))
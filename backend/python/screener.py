@@ -0,0 +1,239 @@
+import os
+import sys
+import json
+import logging
+import pathlib
+import argparse
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import market_data
+import risk_analysis
+
+CURRENT_DIR = pathlib.Path(__file__).parent
+PANEL_PATH = CURRENT_DIR / 'cache' / 'screener_panel.pkl'
+
+# Bars of OHLCV kept per symbol so new bars can be folded in without refetching
+# the full history: enough for MA200 and for the EMA-based indicators to settle.
+TAIL_BARS = risk_analysis.feature_windows('1d')['warmup'] + 50
+# Window requested from the provider when checking for new bars
+REFRESH_PERIOD = '1mo'
+
+# Panel columns are renamed to plain identifiers so they can be used in expressions
+PANEL_COLUMN_NAMES = {'Daily Return': 'Daily_Return'}
+
+
+class IndicatorPanel:
+    """
+    Latest technical indicators for every symbol in the universe, one row per
+    symbol, so screens run as vectorized column operations across all of them.
+
+    Usage:
+        panel = IndicatorPanel.load_or_build()
+        panel.screen('RSI < 30 & Close > MA200', sort_by='ROC_10')
+    """
+
+    def __init__(self, interval='1d'):
+        self.interval = interval
+        # symbol -> latest indicator row, OHLCV tail, provider name, and OBV
+        # running total at the tail's last bar
+        self._rows = {}
+        self._panel = None
+        self._tails = {}
+        self._sources = {}
+        self._obv = {}
+
+    def _latest_row(self, symbol, data):
+        if len(data) < 2:
+            raise ValueError(f"Insufficient data to compute indicators for {symbol}")
+
+        last, prev = data.iloc[-1], data.iloc[-2]
+        row = {name: last[name] for name in ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']}
+        row.update({PANEL_COLUMN_NAMES.get(name, name): float(last[name]) for name in risk_analysis.FEATURE_COLUMNS})
+        row['GoldenCross'] = bool(last['MA50'] > last['MA200'] and prev['MA50'] <= prev['MA200'])
+        row['DeathCross'] = bool(last['MA50'] < last['MA200'] and prev['MA50'] >= prev['MA200'])
+        return row, data.set_index('Date')['OBV']
+
+    def _store(self, symbol, row):
+        self._rows[symbol] = row
+        self._panel = None
+
+    @property
+    def panel(self):
+        """
+        The universe as a DataFrame indexed by symbol (rebuilt lazily after changes).
+        """
+        if self._panel is None:
+            self._panel = pd.DataFrame.from_dict(self._rows, orient='index')
+        return self._panel
+
+    def add_symbol(self, symbol, ohlcv, source='csv', period='max'):
+        """
+        Compute indicators for a symbol from its full history and add it to the panel.
+        Full-history features come from the shared feature store.
+        """
+        row, _ = self._latest_row(symbol, risk_analysis.FEATURE_STORE.get(symbol, self.interval, ohlcv, period))
+        self._tails[symbol] = ohlcv.iloc[-TAIL_BARS:]
+        self._sources[symbol] = source
+        self._obv[symbol] = row['OBV']
+        self._store(symbol, row)
+
+    def update_symbol(self, symbol, new_bars):
+        """
+        Fold newly arrived bars into a symbol's row, recomputing over the kept
+        tail only. Returns the number of bars added.
+        """
+        tail = self._tails[symbol]
+        new_bars = new_bars[new_bars.index > tail.index[-1]]
+        if new_bars.empty:
+            return 0
+
+        tail = pd.concat([tail, new_bars[tail.columns]])
+        data = risk_analysis.add_features(risk_analysis.preprocess_data(tail), self.interval, copy=False)
+        row, obv = self._latest_row(symbol, data)
+        # OBV is a running total; re-base the tail's OBV on the stored total
+        row['OBV'] = self._obv[symbol] + (obv.iloc[-1] - obv.loc[self._tails[symbol].index[-1]])
+
+        self._tails[symbol] = tail.iloc[-TAIL_BARS:]
+        self._obv[symbol] = row['OBV']
+        self._store(symbol, row)
+        return len(new_bars)
+
+    def build(self, symbols=None):
+        """
+        Build rows for every symbol with local history in backend/data.
+        """
+        provider = market_data.get_provider('csv')
+        for symbol in symbols or provider.symbols():
+            try:
+                self.add_symbol(symbol, provider.history(symbol, period='max', interval=self.interval), 'csv')
+            except Exception as e:
+                logging.warning(f"Skipping {symbol} in screener panel: {e}")
+        return self
+
+    def add_ticker(self, ticker, provider=None):
+        """
+        Add a live ticker to the panel using the configured market data provider.
+        """
+        provider = provider or market_data.DEFAULT_PROVIDER
+        period = risk_analysis.default_period(self.interval)
+        ohlcv = risk_analysis.get_stock_data(ticker, period, self.interval, provider)
+        self.add_symbol(ticker, ohlcv[market_data.OHLCV_COLUMNS], provider, period)
+
+    def refresh(self):
+        """
+        Fetch recent bars for every symbol from its provider and fold in any new ones.
+        Returns {symbol: bars added} for the symbols that changed.
+        """
+        updated = {}
+        for symbol, source in self._sources.items():
+            try:
+                recent = market_data.get_provider(source).history(symbol, period=REFRESH_PERIOD,
+                                                                  interval=self.interval)
+                added = self.update_symbol(symbol, recent)
+                if added:
+                    updated[symbol] = added
+            except Exception as e:
+                logging.warning(f"Failed to refresh {symbol}: {e}")
+        return updated
+
+    def screen(self, filter_expr=None, sort_by=None, ascending=False, limit=None, columns=None):
+        """
+        Filter and rank the universe with pandas expressions over panel columns,
+        e.g. filter_expr='RSI < 30 & Close > MA200', sort_by='ROC_10'.
+        sort_by may be a column name or an expression such as 'Close / MA200'.
+        """
+        result = self.panel
+        try:
+            if filter_expr:
+                result = result[result.eval(filter_expr).astype(bool)]
+            if sort_by:
+                key = result[sort_by] if sort_by in result.columns else result.eval(sort_by)
+                result = result.loc[key.sort_values(ascending=ascending).index]
+        except Exception as e:
+            raise ValueError(f"Invalid screener expression: {e}")
+
+        if columns:
+            result = result[columns]
+        if limit:
+            result = result.head(limit)
+        return result
+
+    def save(self, path=PANEL_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        joblib.dump({
+            'interval': self.interval,
+            'rows': self._rows,
+            'tails': self._tails,
+            'sources': self._sources,
+            'obv': self._obv
+        }, path)
+
+    @classmethod
+    def load(cls, path=PANEL_PATH):
+        state = joblib.load(path)
+        panel = cls(state['interval'])
+        panel._rows = state['rows']
+        panel._tails = state['tails']
+        panel._sources = state['sources']
+        panel._obv = state['obv']
+        return panel
+
+    @classmethod
+    def load_or_build(cls, path=PANEL_PATH):
+        """
+        Load the cached panel, building (and caching) it from backend/data if missing.
+        """
+        if os.path.exists(path):
+            return cls.load(path)
+        panel = cls().build()
+        panel.save(path)
+        return panel
+
+
+def to_records(result):
+    """
+    JSON-ready rows with the symbol included and dates as ISO strings.
+    """
+    records = result.reset_index(names='Symbol')
+    if 'Date' in records.columns:
+        records['Date'] = records['Date'].astype(str)
+    records = records.replace({np.nan: None})
+    return records.to_dict(orient='records')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Cross-sectional stock screener')
+    parser.add_argument('--filter', type=str, default=None, help="Filter expression, e.g. 'RSI < 30 & Close > MA200'")
+    parser.add_argument('--sort', type=str, default=None, help='Column or expression to rank by')
+    parser.add_argument('--ascending', action='store_true', help='Sort ascending (default: descending)')
+    parser.add_argument('--limit', type=int, default=None, help='Maximum rows to return')
+    parser.add_argument('--columns', type=str, nargs='+', default=None, help='Columns to include in the output')
+    parser.add_argument('--add', type=str, nargs='+', default=[], help='Live tickers to add to the panel')
+    parser.add_argument('--refresh', action='store_true', help='Fold in new bars before screening')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the panel from backend/data')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    try:
+        args = parse_args()
+        panel = IndicatorPanel().build() if args.rebuild else IndicatorPanel.load_or_build()
+
+        changed = bool(args.rebuild)
+        for ticker in args.add:
+            panel.add_ticker(ticker)
+            changed = True
+        if args.refresh:
+            changed = bool(panel.refresh()) or changed
+        if changed:
+            panel.save()
+
+        result = panel.screen(args.filter, args.sort, args.ascending, args.limit, args.columns)
+        print(json.dumps({'count': len(result), 'results': to_records(result)}))
+        sys.exit(0)
+    except Exception as e:
+        print(json.dumps({'error': str(e)}))
+        sys.exit(1)
@@ -0,0 +1,81 @@
+import os
+import re
+import time
+import pathlib
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+CURRENT_DIR = pathlib.Path(__file__).parent
+LOCK_DIR = pathlib.Path(os.environ.get('SINGLE_FLIGHT_LOCK_DIR', CURRENT_DIR / 'cache' / 'locks'))
+
+# Poll interval while waiting for a lock held by another process on Windows
+WINDOWS_POLL_SECONDS = 0.1
+
+# key -> [threading.Lock, number of threads holding or waiting for it]
+_in_flight = {}
+_registry_lock = threading.Lock()
+
+
+def lock_path(key):
+    return LOCK_DIR / f"{re.sub(r'[^A-Za-z0-9_.-]', '_', key)}.lock"
+
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
+            time.sleep(WINDOWS_POLL_SECONDS)
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def single_flight(key):
+    """
+    Run a block for `key` in at most one thread of one process at a time.
+    Threads of this process queue on an in-process lock, and the holder takes
+    an advisory lock on a per-key file so other processes queue too. Callers
+    should re-check whether the work is still needed once inside, since
+    whoever held the lock before them has usually just done it.
+
+    Usage:
+        with single_flight(f'train:{ticker}'):
+            if not model_is_current():
+                train()
+    """
+    with _registry_lock:
+        entry = _in_flight.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+
+    try:
+        with entry[0]:
+            os.makedirs(LOCK_DIR, exist_ok=True)
+            with open(lock_path(key), 'a+') as f:
+                _lock_file(f)
+                try:
+                    yield
+                finally:
+                    _unlock_file(f)
+    finally:
+        with _registry_lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _in_flight[key]
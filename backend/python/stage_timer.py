@@ -0,0 +1,154 @@
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Stage timing is off unless explicitly enabled, so the instrumented
+# pipeline pays only a flag check per stage.
+ENABLED = os.environ.get('RISK_ANALYSIS_TIMINGS', '0') == '1'
+
+# Histogram bucket upper bounds in milliseconds (last bucket is open ended)
+HISTOGRAM_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+_timings = {}
+_histograms = {}
+_stack = []
+
+
+class _NullStage:
+    """Shared no-op context used while timing is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def enable():
+    """
+    Turn on stage timing and start memory tracing.
+    """
+    global ENABLED
+    ENABLED = True
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    """
+    Turn off stage timing and stop memory tracing.
+    """
+    global ENABLED
+    ENABLED = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def reset():
+    """
+    Clear the per-run timings. Histograms are kept so they aggregate across runs.
+    """
+    _timings.clear()
+    _stack.clear()
+
+
+@contextmanager
+def _timed_stage(name):
+    path = '/'.join([frame['name'] for frame in _stack] + [name])
+    current, peak_so_far = tracemalloc.get_traced_memory()
+    if _stack:
+        _stack[-1]['child_peak'] = max(_stack[-1]['child_peak'], peak_so_far)
+    tracemalloc.reset_peak()
+    frame = {'name': name, 'child_peak': 0}
+    _stack.append(frame)
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield
+    finally:
+        wall_ms = (time.perf_counter() - wall_start) * 1000
+        cpu_ms = (time.process_time() - cpu_start) * 1000
+        _, peak = tracemalloc.get_traced_memory()
+        # reset_peak() in nested stages hides earlier peaks, so each stage
+        # hands the peak it saw back to its parent through the stack.
+        peak_bytes = max(peak, frame['child_peak']) - current
+        _stack.pop()
+        if _stack:
+            _stack[-1]['child_peak'] = max(_stack[-1]['child_peak'], max(peak, frame['child_peak']))
+        _record(path, wall_ms, cpu_ms, max(peak_bytes, 0))
+
+
+def stage(name):
+    """
+    Time a pipeline stage. Nested stages are recorded under 'outer/inner' names.
+
+    Usage:
+        with stage_timer.stage('add_features'):
+            data = add_features(data)
+    """
+    if not ENABLED:
+        return _NULL_STAGE
+    return _timed_stage(name)
+
+
+def _record(path, wall_ms, cpu_ms, peak_bytes):
+    entry = _timings.get(path)
+    if entry is None:
+        entry = _timings[path] = {'calls': 0, 'wall_ms': 0.0, 'cpu_ms': 0.0, 'peak_mem_kb': 0.0}
+    entry['calls'] += 1
+    entry['wall_ms'] += wall_ms
+    entry['cpu_ms'] += cpu_ms
+    entry['peak_mem_kb'] = max(entry['peak_mem_kb'], peak_bytes / 1024)
+
+    histogram = _histograms.get(path)
+    if histogram is None:
+        histogram = _histograms[path] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                                         'buckets': [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)}
+    histogram['count'] += 1
+    histogram['total_ms'] += wall_ms
+    histogram['max_ms'] = max(histogram['max_ms'], wall_ms)
+    bucket = len(HISTOGRAM_BUCKETS_MS)
+    for i, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+        if wall_ms <= bound:
+            bucket = i
+            break
+    histogram['buckets'][bucket] += 1
+
+
+def get_timings():
+    """
+    Return the timings recorded since the last reset() as a JSON-ready dict.
+    """
+    return {
+        path: {
+            'calls': entry['calls'],
+            'wall_ms': round(entry['wall_ms'], 3),
+            'cpu_ms': round(entry['cpu_ms'], 3),
+            'peak_mem_kb': round(entry['peak_mem_kb'], 1)
+        }
+        for path, entry in _timings.items()
+    }
+
+
+def get_histograms():
+    """
+    Return wall-time histograms aggregated over every run since start-up.
+    """
+    labels = [f'<={bound}ms' for bound in HISTOGRAM_BUCKETS_MS] + [f'>{HISTOGRAM_BUCKETS_MS[-1]}ms']
+    return {
+        path: {
+            'count': histogram['count'],
+            'mean_ms': round(histogram['total_ms'] / histogram['count'], 3),
+            'max_ms': round(histogram['max_ms'], 3),
+            'buckets': {label: n for label, n in zip(labels, histogram['buckets']) if n}
+        }
+        for path, histogram in _histograms.items()
+    }
+
+
+if ENABLED:
+    enable()
@@ -0,0 +1,109 @@
+import shutil
+import pathlib
+import tempfile
+import unittest
+
+try:
+    import pandas as pd
+    import ingest
+    import market_data
+except ImportError:  # pandas not installed
+    ingest = None
+
+
+def _bars(dates, close=100.0):
+    index = pd.DatetimeIndex(pd.to_datetime(dates), name='Date')
+    return pd.DataFrame({'Open': close, 'High': close + 1, 'Low': close - 1, 'Close': close, 'Volume': 1000},
+                        index=index)
+
+
+if ingest is not None:
+    class FakeProvider(market_data.MarketDataProvider):
+        """
+        Serves a fixed history per ticker and records the periods requested.
+        """
+        name = 'fake'
+
+        def __init__(self, histories):
+            self.histories = histories
+            self.periods = []
+
+        def history(self, ticker, period='1y', interval='1d'):
+            self.periods.append(period)
+            return self.histories[ticker]
+
+
+@unittest.skipIf(ingest is None, 'pandas is not installed')
+class IngestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = pathlib.Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def write_csv(self, symbol, bars):
+        rows = ingest.to_nse_rows(bars, symbol, bars['Close'].iloc[0], ingest.NSE_COLUMNS)
+        rows.to_csv(self.data_dir / f'{symbol}.csv', index=False)
+
+    def test_appends_deduplicated_new_bars_and_records_manifest(self):
+        self.write_csv('TCS', _bars(['2021-04-26', '2021-04-27']))
+        # Overlaps the stored bars, repeats a date (the later bar wins) and is unsorted
+        fetched = pd.concat([_bars(['2021-04-27', '2021-04-29', '2021-04-28'], 110.0),
+                             _bars(['2021-04-29'], 120.0)])
+        provider = FakeProvider({'TCS.NS': fetched})
+
+        report, = ingest.ingest_all(['TCS'], provider, self.data_dir, workers=1)
+
+        self.assertEqual(report['status'], 'updated')
+        self.assertEqual(report['added'], 2)
+        stored = pd.read_csv(self.data_dir / 'TCS.csv')
+        self.assertEqual(stored['Date'].tolist(), ['2021-04-26', '2021-04-27', '2021-04-28', '2021-04-29'])
+        self.assertEqual(stored['Close'].tolist(), [100.0, 100.0, 110.0, 120.0])
+        self.assertEqual(stored['Prev Close'].tolist()[2:], [100.0, 110.0])
+
+        entry = market_data.read_manifest(self.data_dir)['TCS']
+        self.assertEqual((entry['watermark'], entry['rows']), ('2021-04-29', 4))
+        self.assertEqual(entry['sha256'], market_data.file_fingerprint(self.data_dir / 'TCS.csv'))
+        self.assertEqual(market_data.CsvProvider(self.data_dir).fingerprint('TCS'), entry['sha256'])
+
+    def test_nothing_new_leaves_file_unchanged(self):
+        self.write_csv('TCS', _bars(['2021-04-26', '2021-04-27']))
+        before = (self.data_dir / 'TCS.csv').read_bytes()
+
+        report, = ingest.ingest_all(['TCS'], FakeProvider({'TCS.NS': _bars(['2021-04-26', '2021-04-27'])}),
+                                    self.data_dir, workers=1)
+
+        self.assertEqual(report['status'], 'unchanged')
+        self.assertEqual((self.data_dir / 'TCS.csv').read_bytes(), before)
+
+    def test_invalid_bars_are_rejected(self):
+        self.write_csv('TCS', _bars(['2021-04-26']))
+        before = (self.data_dir / 'TCS.csv').read_bytes()
+        bad = _bars(['2021-04-27'])
+        bad['High'] = 50.0
+
+        report, = ingest.ingest_all(['TCS'], FakeProvider({'TCS.NS': bad}), self.data_dir, workers=1)
+
+        self.assertEqual(report['status'], 'rejected')
+        self.assertEqual(report['issues'], ['high below low'])
+        self.assertEqual((self.data_dir / 'TCS.csv').read_bytes(), before)
+        self.assertNotIn('TCS', market_data.read_manifest(self.data_dir))
+
+    def test_empty_file_gets_a_header(self):
+        (self.data_dir / 'NEWCO.csv').write_bytes(b'')
+        provider = FakeProvider({'NEWCO.NS': _bars(['2021-04-26', '2021-04-27'])})
+
+        report, = ingest.ingest_all(['NEWCO'], provider, self.data_dir, workers=1)
+
+        self.assertEqual(report['status'], 'updated')
+        self.assertEqual(provider.periods, ['max'])
+        stored = pd.read_csv(self.data_dir / 'NEWCO.csv')
+        self.assertEqual(list(stored.columns), ingest.NSE_COLUMNS)
+        self.assertEqual(stored['Date'].tolist(), ['2021-04-26', '2021-04-27'])
+        history = market_data.CsvProvider(self.data_dir).history('NEWCO.NS', period='max')
+        self.assertEqual(len(history), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import time
+import unittest
+from unittest import mock
+
+try:
+    import numpy as np
+    import pandas as pd
+    import retrain_policy
+except ImportError:  # pandas not installed
+    retrain_policy = None
+
+TRAINING_BARS = 250
+
+
+def _stationary_frame(bars, seed=0):
+    """
+    Drift features following a stationary AR(1) process, smooth like the real
+    indicators, with OHLCV columns for the data fingerprint.
+    """
+    rng = np.random.default_rng(seed)
+    features = retrain_policy.DRIFT_FEATURES
+    values = np.zeros((bars, len(features)))
+    noise = rng.standard_normal((bars, len(features))) * np.sqrt(1 - 0.9 ** 2)
+    for i in range(1, bars):
+        values[i] = 0.9 * values[i - 1] + noise[i]
+    frame = pd.DataFrame(values, columns=features)
+    frame['Volatility'] = 0.25 + 0.02 * frame['Volatility']
+
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+    frame['Date'] = pd.bdate_range('2015-01-01', periods=bars)
+    for column in ['Open', 'High', 'Low', 'Close']:
+        frame[column] = close
+    frame['Volume'] = 1000
+    return frame
+
+
+def _metrics(training):
+    # No data_end: the recent-accuracy check needs a model and is not exercised
+    return {'last_full_retrain': time.time(),
+            **retrain_policy.training_profile(training, retrain_policy.DRIFT_FEATURES)}
+
+
+@unittest.skipIf(retrain_policy is None, 'pandas is not installed')
+class RetrainPolicyTest(unittest.TestCase):
+
+    def decide(self, metrics, data):
+        return retrain_policy.decide(metrics, data, None, None, retrain_policy.DRIFT_FEATURES)
+
+    def test_stationary_series_is_kept(self):
+        frame = _stationary_frame(2000)
+        actions = []
+        for start in range(0, len(frame) - TRAINING_BARS - retrain_policy.MIN_RECENT_BARS, 10):
+            metrics = _metrics(frame.iloc[start:start + TRAINING_BARS])
+            # The served window has moved on by MIN_RECENT_BARS new bars
+            data = frame.iloc[start + retrain_policy.MIN_RECENT_BARS:
+                              start + TRAINING_BARS + retrain_policy.MIN_RECENT_BARS]
+            actions.append(self.decide(metrics, data)['action'])
+        self.assertGreaterEqual(actions.count(retrain_policy.KEEP) / len(actions), 0.9)
+
+    def test_shifted_feature_is_updated(self):
+        frame = _stationary_frame(TRAINING_BARS + retrain_policy.MIN_RECENT_BARS)
+        metrics = _metrics(frame.iloc[:TRAINING_BARS])
+        data = frame.iloc[retrain_policy.MIN_RECENT_BARS:].copy()
+        data.loc[data.index[-retrain_policy.MIN_RECENT_BARS:], 'RSI'] += 3.0
+
+        decision = self.decide(metrics, data)
+
+        self.assertEqual(decision['action'], retrain_policy.UPDATE)
+        self.assertEqual(decision['statistics']['most_shifted_feature'], 'RSI')
+
+    def test_accuracy_drop_must_exceed_sampling_noise(self):
+        bars = retrain_policy.MIN_RECENT_BARS
+        frame = _stationary_frame(TRAINING_BARS + bars)
+        frame['Risk Level'] = 'Low'
+        metrics = {**_metrics(frame.iloc[:TRAINING_BARS]), 'cv_accuracy_mean': 0.84,
+                   'data_end': str(frame['Date'].iloc[TRAINING_BARS - 1])}
+        data = frame.iloc[bars:]
+
+        # 6 of 10 right is within two standard errors of 0.84; none right is not
+        for correct, action in [(6, retrain_policy.KEEP), (0, retrain_policy.RETRAIN)]:
+            model = mock.Mock()
+            model.predict.return_value = np.array(['Low'] * correct + ['High'] * (bars - correct))
+            scaler = mock.Mock(transform=lambda X: X)
+            decision = retrain_policy.decide(metrics, data, model, scaler, retrain_policy.DRIFT_FEATURES)
+            self.assertEqual(decision['action'], action, decision['reasons'])
+
+    def test_profile_without_mean_spread_is_retrained(self):
+        frame = _stationary_frame(TRAINING_BARS + retrain_policy.MIN_RECENT_BARS)
+        metrics = _metrics(frame.iloc[:TRAINING_BARS])
+        del metrics['feature_mean_stds']
+
+        decision = self.decide(metrics, frame.iloc[retrain_policy.MIN_RECENT_BARS:])
+
+        self.assertEqual(decision['action'], retrain_policy.RETRAIN)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import os
+import time
+import shutil
+import pathlib
+import tempfile
+import unittest
+import multiprocessing
+from unittest import mock
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import single_flight
+
+try:
+    import joblib
+    import market_data
+    import retrain_policy
+    import risk_analysis
+except ImportError:  # pandas_ta, scikit-learn or pandas not installed
+    risk_analysis = None
+
+PROCESSES = 4
+THREADS = 3
+TICKERS = ['TCS.NS', 'INFY.NS']
+
+
+def _record_run(work_dir, ticker):
+    with open(work_dir / 'runs.log', 'a') as f:
+        f.write(f'{ticker}\n')
+
+
+def _runs(work_dir):
+    path = work_dir / 'runs.log'
+    return Counter(path.read_text().split()) if path.exists() else Counter()
+
+
+def _build_artifacts(work_dir):
+    """
+    Process body: every thread builds each ticker's artifact unless it exists,
+    slowly enough that unguarded builders would overlap.
+    """
+    single_flight.LOCK_DIR = work_dir / 'locks'
+
+    def build(ticker):
+        with single_flight.single_flight(f'train:{ticker}'):
+            artifact = work_dir / f'{ticker}.artifact'
+            if not artifact.exists():
+                _record_run(work_dir, ticker)
+                time.sleep(0.2)
+                artifact.write_text(ticker)
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        list(pool.map(build, TICKERS * THREADS))
+
+
+def _request_models(work_dir):
+    """
+    Process body: concurrent get_model requests for every ticker against an
+    empty models directory, counting each training run.
+    """
+    single_flight.LOCK_DIR = work_dir / 'locks'
+    market_data.set_default_provider('csv')
+    risk_analysis.MODELS_DIR = work_dir / 'models'
+    risk_analysis.FEATURE_STORE.directory = work_dir / 'features'
+
+    # One small forest instead of the full grid keeps training fast
+    grid_search = risk_analysis.GridSearchCV
+    risk_analysis.GridSearchCV = lambda estimator, parameters, **kwargs: grid_search(
+        estimator, [{'n_estimators': [20]}], **kwargs)
+
+    train = risk_analysis.train_and_save_model
+
+    def counted_train(ticker, *args, **kwargs):
+        _record_run(work_dir, ticker)
+        return train(ticker, *args, **kwargs)
+
+    risk_analysis.train_and_save_model = counted_train
+    with ThreadPoolExecutor(THREADS) as pool:
+        list(pool.map(lambda i: risk_analysis.get_model(TICKERS[i % len(TICKERS)], '1y'), range(THREADS)))
+
+
+def _run_processes(target, work_dir):
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=target, args=(work_dir,)) for _ in range(PROCESSES)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    return [process.exitcode for process in processes]
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = pathlib.Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_one_build_per_key_across_processes_and_threads(self):
+        exit_codes = _run_processes(_build_artifacts, self.work_dir)
+        self.assertEqual(exit_codes, [0] * PROCESSES)
+        self.assertEqual(_runs(self.work_dir), Counter({ticker: 1 for ticker in TICKERS}))
+
+    def test_registry_is_emptied(self):
+        with mock.patch.object(single_flight, 'LOCK_DIR', self.work_dir), \
+                single_flight.single_flight('train:TCS.NS'):
+            self.assertIn('train:TCS.NS', single_flight._in_flight)
+        self.assertEqual(single_flight._in_flight, {})
+
+
+@unittest.skipIf(risk_analysis is None, 'risk analysis dependencies are not installed')
+class ModelTrainingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = pathlib.Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_one_training_run_per_ticker(self):
+        exit_codes = _run_processes(_request_models, self.work_dir)
+        self.assertEqual(exit_codes, [0] * PROCESSES)
+        self.assertEqual(_runs(self.work_dir), Counter({ticker: 1 for ticker in TICKERS}))
+
+    def test_background_training_started_once(self):
+        with mock.patch.object(risk_analysis, 'TRAINING_MARKER_DIR', self.work_dir), \
+                mock.patch.object(risk_analysis, 'BACKGROUND_TRAINING', True), \
+                mock.patch.object(risk_analysis.subprocess, 'Popen') as popen:
+            started = [risk_analysis.start_background_training('TCS.NS', '1y', '1d') for _ in range(3)]
+            self.assertEqual(started, [True, False, False])
+            self.assertEqual(popen.call_count, 1)
+
+            # A marker left by a trainer that died stops blocking after TRAINING_MARKER_SECONDS
+            marker = risk_analysis.training_marker_path('TCS.NS', '1d')
+            stale = time.time() - risk_analysis.TRAINING_MARKER_SECONDS - 1
+            os.utime(marker, (stale, stale))
+            self.assertTrue(risk_analysis.start_background_training('TCS.NS', '1y', '1d'))
+
+    def test_missing_or_unreadable_metrics_retrain(self):
+        model_path = self.work_dir / 'TCS.NS_risk_model.pkl'
+        scaler_path = self.work_dir / 'TCS.NS_scaler.pkl'
+        joblib.dump(object(), model_path)
+        joblib.dump(object(), scaler_path)
+        metrics_path = pathlib.Path(risk_analysis.get_metrics_path(str(model_path)))
+
+        for metrics in [None, '{"features_used": [']:
+            if metrics is not None:
+                metrics_path.write_text(metrics)
+            loaded, decision, _ = risk_analysis._load_model_and_decide('TCS.NS', '1y', '1d', str(model_path),
+                                                                       str(scaler_path))
+            self.assertEqual(loaded, (None, None, None))
+            self.assertEqual(decision['action'], retrain_policy.RETRAIN)
+
+
+if __name__ == '__main__':
+    unittest.main()